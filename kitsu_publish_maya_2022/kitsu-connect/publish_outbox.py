@@ -0,0 +1,294 @@
+import os, sys
+import json
+import time
+import uuid
+import queue
+import shutil
+import socket
+import threading
+
+import gazu
+
+from kitsu_cache import shared_config_dir
+from thread_client import clone_client
+
+try:
+    import maya.utils
+    import maya.cmds as cmds
+except ImportError:  # mayapy without the UI, or outside Maya
+    maya = None
+    cmds = None
+
+
+SESSION_ID = uuid.uuid4().hex  # Tells this Maya session's claims from the ones of a dead session
+
+
+class MissingStatus(Exception):
+    pass
+
+
+def process_running(pid):
+    if sys.platform == "win32":
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return kernel32.GetLastError() == 5  # Access denied, it exists
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class PublishOutbox:
+    """
+    Playblasts waiting to be published, kept on disk until Kitsu has them.
+
+    Each job is a folder holding job.json and the media file. Background threads
+    post the comment, create the preview and upload the file, saving the job after
+    each stage so a retry, or the next Maya session, picks up where it stopped.
+    Listeners are called on Maya's main thread when a job ends.
+    """
+    RETRY_DELAYS = (10, 30, 120, 300, 900)  # Seconds before each new attempt
+    CLAIM_TIMEOUT = 300  # Seconds without a heartbeat after which a claim from another machine is free again
+    CLAIM_HEARTBEAT = 60  # Seconds between two touches of the claim while a job is processed
+    CLAIM_RETRY = 60  # Seconds before a job claimed by another live session is looked at again
+    WORKERS = 4  # Uploads running at once
+
+    def __init__(self, folder=None):
+        self.folder = folder or os.path.join(shared_config_dir(), 'maya_outbox')
+        os.makedirs(self.folder, exist_ok=True)
+        self.queue = queue.Queue()
+        self.listeners = [notify_in_viewport]
+        self.threads = []
+        self.lock = threading.Lock()
+
+    # Jobs on disk
+
+    def job_folder(self, job_id):
+        return os.path.join(self.folder, job_id)
+
+    def save_job(self, job):
+        path = os.path.join(self.job_folder(job['id']), 'job.json')
+        with open(path + '.tmp', 'w') as file:
+            json.dump(job, file, indent=4)
+        os.replace(path + '.tmp', path)
+
+    def load_job(self, job_id):
+        try:
+            with open(os.path.join(self.job_folder(job_id), 'job.json'), 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def pending_jobs(self):
+        jobs = []
+        for entry in os.scandir(self.folder):
+            job = self.load_job(entry.name) if entry.is_dir() else None
+            if job and job['state'] != 'done':
+                jobs.append(job)
+        return sorted(jobs, key=lambda job: job['created_at'])
+
+    def submit(self, task_id, comment_text, media_file, status_short_name='wfa', scene_file=None):
+        """ Move the media into the outbox and queue its upload, returns the job right away """
+        job = self.add_job(task_id, comment_text, media_file, status_short_name, scene_file)
+        self.enqueue(job)
+        return job
+
+    def add_job(self, task_id, comment_text, media_file, status_short_name='wfa', scene_file=None):
+        """ Move the media into the outbox and write its job, without starting the upload """
+        job_id = time.strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:8]
+        os.makedirs(self.job_folder(job_id))
+        media_path = os.path.join(self.job_folder(job_id), os.path.basename(media_file))
+        shutil.move(media_file, media_path)
+
+        job = {
+            'id': job_id,
+            'task_id': task_id,
+            'status_short_name': status_short_name,
+            'comment_text': comment_text,
+            'media_file': media_path,
+            'scene_file': scene_file,
+            'created_at': time.time(),
+            'state': 'pending',
+            'attempts': 0,
+            'last_error': None,
+            # Stages done so far
+            'comment_id': None,
+            'preview_file_id': None,
+            'uploaded': False,
+        }
+        self.save_job(job)
+        return job
+
+    def resume(self):
+        """
+        Queue the jobs left by a previous session, failed ones get a new round of attempts.
+
+        Jobs that can't succeed by retrying, like a missing review status, stay failed.
+        """
+        jobs = [job for job in self.pending_jobs() if not job.get('permanent')]
+        for job in jobs:
+            job['attempts'] = 0
+            job['state'] = 'pending'
+            self.enqueue(job)
+        return jobs
+
+    # Worker
+
+    def enqueue(self, job):
+        self.queue.put(job['id'])
+        with self.lock:
+            self.threads = [thread for thread in self.threads if thread.is_alive()]
+            if len(self.threads) < min(self.WORKERS, self.queue.qsize()):
+                thread = threading.Thread(target=self._worker, name='kitsu-outbox', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def _worker(self):
+        while True:
+            job_id = self.queue.get()
+            job = self.load_job(job_id)
+            if job is None or job['state'] == 'done':
+                continue
+            if not self._claim(job_id):
+                # Another live session has it, look again later in case it dies before finishing
+                timer = threading.Timer(self.CLAIM_RETRY, self.queue.put, (job_id,))
+                timer.daemon = True
+                timer.start()
+                continue
+            finished = threading.Event()
+            heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, finished), daemon=True)
+            heartbeat.start()
+            try:
+                self._process(job)
+            finally:
+                finished.set()
+                self._release(job_id)
+
+    def _claim(self, job_id):
+        """ Only one Maya session works on a job at a time """
+        claim = os.path.join(self.job_folder(job_id), 'claim')
+        if self._claim_is_stale(claim):
+            try:
+                os.remove(claim)
+            except OSError:
+                pass
+        try:
+            handle = os.open(claim, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(handle, json.dumps({'host': socket.gethostname(), 'pid': os.getpid(), 'session': SESSION_ID}).encode())
+            os.close(handle)
+            return True
+        except OSError:
+            return False
+
+    def _claim_is_stale(self, claim):
+        """ A claim is stale when its session is gone, or when it stopped beating on another machine """
+        try:
+            with open(claim, 'r') as file:
+                owner = json.load(file)
+            modified = os.path.getmtime(claim)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError):
+            owner = {}  # Unreadable, only the timeout applies
+            modified = 0
+        if isinstance(owner, int):
+            owner = {'host': socket.gethostname(), 'pid': owner}  # Written by an older version, the pid alone
+        if owner.get('host') == socket.gethostname():
+            if owner.get('pid') == os.getpid():
+                return owner.get('session') != SESSION_ID
+            if owner.get('pid') and not process_running(owner['pid']):
+                return True
+        return time.time() - modified > self.CLAIM_TIMEOUT
+
+    def _heartbeat(self, job_id, finished):
+        """ Touch the claim while a long upload runs, so other sessions know it is alive """
+        claim = os.path.join(self.job_folder(job_id), 'claim')
+        while not finished.wait(self.CLAIM_HEARTBEAT):
+            try:
+                os.utime(claim)
+            except OSError:
+                return
+
+    def _release(self, job_id):
+        try:
+            os.remove(os.path.join(self.job_folder(job_id), 'claim'))
+        except OSError:
+            pass
+
+    def _process(self, job):
+        job['attempts'] += 1
+        try:
+            client = clone_client()
+
+            if not job['comment_id']:
+                status = gazu.task.get_task_status_by_short_name(job['status_short_name'], client=client)
+                if not status:
+                    raise MissingStatus(f"There is no '{job['status_short_name']}' task status on kitsu")
+                comment = gazu.task.add_comment(job['task_id'], status, job['comment_text'], client=client)
+                job['comment_id'] = comment['id']
+                self.save_job(job)
+
+            if not job['preview_file_id']:
+                preview_file = gazu.task.create_preview(job['task_id'], job['comment_id'], client=client)
+                job['preview_file_id'] = preview_file['id']
+                self.save_job(job)
+
+            if not job['uploaded']:
+                gazu.task.upload_preview_file(job['preview_file_id'], job['media_file'], client=client)
+                job['uploaded'] = True
+                self.save_job(job)
+
+            job['state'] = 'done'
+            self.save_job(job)
+            shutil.rmtree(self.job_folder(job['id']), ignore_errors=True)
+            self._notify(job, True, 'Submitted to kitsu !')
+        except Exception as eee:
+            job['last_error'] = str(eee)
+            # A missing status won't appear by waiting, don't retry it
+            if job['attempts'] < len(self.RETRY_DELAYS) and not isinstance(eee, MissingStatus):
+                self.save_job(job)
+                delay = self.RETRY_DELAYS[job['attempts'] - 1]
+                print(f"Kitsu upload of {job['id']} failed ({eee}), retrying in {delay}s")
+                timer = threading.Timer(delay, self.queue.put, (job['id'],))
+                timer.daemon = True
+                timer.start()
+            else:
+                job['state'] = 'failed'
+                job['permanent'] = isinstance(eee, MissingStatus)
+                self.save_job(job)
+                self._notify(job, False, 'Failed to Submit : ' + str(eee))
+
+    def _notify(self, job, success, message):
+        for listener in self.listeners:
+            if maya is not None:
+                maya.utils.executeDeferred(listener, job, success, message)
+            else:
+                listener(job, success, message)
+
+
+def notify_in_viewport(job, success, message):
+    print(f"Kitsu publish {job['id']} : {message}")
+    if cmds is not None and not cmds.about(batch=True):
+        color = '#7fbf7f' if success else '#ff7f7f'
+        cmds.inViewMessage(amg=f'<span style="color:{color}">Kitsu : {message}</span>', pos='topCenter', fade=True)
+
+
+_shared = None
+
+
+def shared_outbox():
+    """ One outbox per Maya session, jobs left by the last session are resumed when it is created """
+    global _shared
+    if _shared is None:
+        _shared = PublishOutbox()
+        _shared.resume()
+    return _shared
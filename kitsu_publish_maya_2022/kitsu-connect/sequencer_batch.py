@@ -0,0 +1,55 @@
+import maya.cmds as cmds
+
+
+def sequencer_shots():
+    """ Camera sequencer shots in sequence order, as dicts of name, camera and frame range """
+    shots = []
+    for node in cmds.ls(type='shot') or []:
+        if cmds.shot(node, query=True, mute=True):
+            continue
+        shots.append({
+            'node': node,
+            'name': cmds.shot(node, query=True, shotName=True),
+            'camera': cmds.shot(node, query=True, currentCamera=True),
+            'start_frame': cmds.shot(node, query=True, startTime=True),
+            'end_frame': cmds.shot(node, query=True, endTime=True),
+            'sequence_start': cmds.shot(node, query=True, sequenceStartTime=True),
+        })
+    return sorted(shots, key=lambda shot: shot['sequence_start'])
+
+
+def build_task_index(tasks):
+    """ To-do tasks by (sequence name, shot name, task type name), all lower case """
+    index = {}
+    for task in tasks:
+        if task.get('task_type_for_entity') == 'Asset':
+            continue
+        key = (str(task['sequence_name']).lower(), str(task['entity_name']).lower(), str(task['task_type_name']).lower())
+        index[key] = task
+    return index
+
+
+def match_shots(shots, index, sequence_name, task_type_name):
+    """
+    Find the Kitsu task of each sequencer shot, by shot name in the given sequence and task type.
+
+    Returns:
+        tuple: ([(shot, task), ...], [shot without task, ...]).
+    """
+    matched = []
+    unmatched = []
+    for shot in shots:
+        task = index.get((sequence_name.lower(), shot['name'].lower(), task_type_name.lower()))
+        if task:
+            matched.append((shot, task))
+        else:
+            unmatched.append(shot)
+    return matched, unmatched
+
+
+def describe_match(matched, unmatched):
+    lines = [f'{len(matched)} sequencer shots will be published.']
+    if unmatched:
+        lines.append(f'{len(unmatched)} shots have no matching task and will be skipped : '
+                     + ', '.join(shot['name'] for shot in unmatched))
+    return '\n\n'.join(lines)
@@ -7,7 +7,7 @@ kitsu_path = os.path.join(os.path.dirname(os.path.dirname(user_script_folder)),
 sys.path.append(kitsu_path)
 sys.path.append(os.path.join(kitsu_path, 'site-packages'))
 
-import gazu 
+import token_store
 
 
 # Try to import PySide2 and shiboken2 first, if not available, fallback to PySide6 and shiboken6
@@ -73,8 +73,7 @@ class KitsuLoginWindow(QtWidgets.QDialog):
         }
 
         try:
-            gazu.client.set_host(data['url']+'/api')
-            gazu.log_in(data['user'], data['pwd'])
+            token_store.log_in(data['url']+'/api', data['user'], data['pwd'])
 
             # Write the dictionary to the JSON file
             with open(self.user_config_file, 'w') as json_file:
@@ -104,8 +103,10 @@ class Kitsu_Settings:
             with open(self.user_config_file, 'r') as json_file:
                 data = json.load(json_file)
             try:
-                gazu.client.set_host(data['url']+'/api')
-                gazu.log_in(data['user'], data['pwd'])
+                # Stored tokens skip the password login, it is only used when they can't be refreshed
+                if token_store.restore_session(data['url']+'/api', data['user']):
+                    return True
+                token_store.log_in(data['url']+'/api', data['user'], data['pwd'])
                 return True
             except:
                 self.show_kitsu_login_window()
@@ -0,0 +1,138 @@
+import os, sys
+import queue
+import shutil
+import ctypes
+import threading
+import subprocess
+
+import maya.cmds as cmds
+import maya.mel as mel
+import maya.api.OpenMaya as om
+import maya.api.OpenMayaUI as omui
+
+
+kitsu_path = os.path.dirname(__file__)
+
+WIDTH = 1920
+HEIGHT = 1080
+QUEUE_FRAMES = 8  # Frames captured ahead of ffmpeg, about 8MB each at 1080p
+
+
+def find_ffmpeg():
+    """ ffmpeg next to the tool first, then the one on the PATH """
+    name = 'ffmpeg.exe' if sys.platform == "win32" else 'ffmpeg'
+    bundled = os.path.join(kitsu_path, name)
+    if os.path.isfile(bundled):
+        return bundled
+    return shutil.which('ffmpeg')
+
+
+def scene_fps():
+    return mel.eval('currentTimeUnitToFPS()')
+
+
+def encode_cmd(ffmpeg, width, height, fps, output_file):
+    """ ffmpeg reading bottom-up RGBA frames on stdin, scaled and padded to the review size """
+    return [
+        ffmpeg, '-y', '-loglevel', 'error',
+        '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', f'{width}x{height}', '-r', str(fps), '-i', 'pipe:0',
+        '-vf', f'vflip,scale={WIDTH}:{HEIGHT}:force_original_aspect_ratio=decrease,'
+               f'pad={WIDTH}:{HEIGHT}:(ow-iw)/2:(oh-ih)/2',
+        '-c:v', 'libx264', '-preset', 'fast', '-crf', '18', '-pix_fmt', 'yuv420p',
+        output_file
+    ]
+
+
+def image_bytes(image, size):
+    """ Pixel bytes of an MImage, pixels() is a buffer in recent Maya and an address in older ones """
+    pixels = image.pixels()
+    if isinstance(pixels, int):
+        return ctypes.string_at(pixels, size)
+    return bytes(pixels)
+
+
+def capture_to_movie(output_file, start_frame, end_frame, ffmpeg=None, panel=None):
+    """
+    Capture the active viewport frame by frame and pipe the pixels into ffmpeg.
+
+    Nothing is written to disk but the movie, and ffmpeg encodes a frame while Maya
+    draws the next ones. panel is the model panel to capture, the focused one by default.
+
+    Returns:
+        str: output_file, or None if ffmpeg is missing or the capture failed.
+    """
+    ffmpeg = ffmpeg or find_ffmpeg()
+    if not ffmpeg:
+        print("ffmpeg not found, can't stream the viewport")
+        return None
+
+    if panel is None:
+        panel = cmds.getPanel(withFocus=True)
+        if cmds.getPanel(typeOf=panel) != 'modelPanel':
+            panel = cmds.playblast(activeEditor=True).split('|')[-1]
+    view = omui.M3dView.getM3dViewFromModelPanel(panel)
+    width, height = view.portWidth(), view.portHeight()
+    hud = cmds.modelEditor(panel, query=True, hud=True)
+    current_time = cmds.currentTime(query=True)
+
+    creationflags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+    log_path = output_file + '.log'
+    log = open(log_path, 'w')
+    process = subprocess.Popen(
+        encode_cmd(ffmpeg, width, height, scene_fps(), output_file),
+        stdin=subprocess.PIPE, stderr=log, creationflags=creationflags
+    )
+
+    # A writer thread feeds ffmpeg so capturing never waits on the pipe
+    frames = queue.Queue(maxsize=QUEUE_FRAMES)
+    errors = []
+
+    def write_frames():
+        while True:
+            data = frames.get()
+            if data is None:
+                break
+            if errors:
+                continue  # Keep draining so the capture loop never blocks on a full queue
+            try:
+                process.stdin.write(data)
+            except (BrokenPipeError, OSError) as eee:
+                errors.append(eee)
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+
+    writer = threading.Thread(target=write_frames, daemon=True)
+    writer.start()
+
+    image = om.MImage()
+    frame_size = width * height * 4
+    try:
+        cmds.modelEditor(panel, edit=True, hud=False)
+        frame = int(start_frame)
+        while frame <= int(end_frame) and not errors:
+            cmds.currentTime(frame, update=True)
+            view.refresh(False, True)
+            view.readColorBuffer(image, True)
+            frames.put(image_bytes(image, frame_size))
+            frame += 1
+    except Exception as eee:
+        errors.append(eee)
+    finally:
+        frames.put(None)
+        writer.join()
+        cmds.modelEditor(panel, edit=True, hud=hud)
+        cmds.currentTime(current_time, update=True)
+
+    returncode = process.wait()
+    log.close()
+    with open(log_path, 'r') as file:
+        stderr = file.read().strip()
+    os.remove(log_path)
+    if returncode != 0 or errors:
+        print(f"Viewport capture failed: {errors[0] if errors else stderr}")
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        return None
+    return output_file
@@ -0,0 +1,118 @@
+import os, sys
+import json
+import shutil
+import tempfile
+import threading
+import subprocess
+
+import maya.cmds as cmds
+import maya.utils
+
+from publish_outbox import notify_in_viewport
+
+
+kitsu_path = os.path.dirname(__file__)
+
+
+def mayapy_executable():
+    name = 'mayapy.exe' if sys.platform == "win32" else 'mayapy'
+    location = os.environ.get('MAYA_LOCATION')
+    if location and os.path.isfile(os.path.join(location, 'bin', name)):
+        return os.path.join(location, 'bin', name)
+    return os.path.join(os.path.dirname(sys.executable), name)
+
+
+def save_scene_copy(folder):
+    """ Export the whole scene to folder without renaming it or touching its modified state """
+    scene_name = cmds.file(q=True, sceneName=True, shortName=True).rsplit(".", 1)[0] or 'untitled'
+    path = os.path.join(folder, scene_name + '.mb')
+    cmds.file(path, exportAll=True, type='mayaBinary', preserveReferences=True, force=True)
+    return path
+
+
+def notify_progress(name, frames_done, frame_count):
+    print(f'Background playblast of {name} : {frames_done}/{frame_count} frames')
+    if not cmds.about(batch=True):
+        cmds.inViewMessage(amg=f'Kitsu : rendering {name} {frames_done}/{frame_count}', pos='botRight', fade=True)
+
+
+def active_camera():
+    panel = cmds.getPanel(withFocus=True)
+    if cmds.getPanel(typeOf=panel) != 'modelPanel':
+        panel = cmds.playblast(activeEditor=True).split('|')[-1]
+    return cmds.modelPanel(panel, query=True, camera=True)
+
+
+class BackgroundPlayblast:
+    """
+    Playblast rendered by a headless mayapy from a copy of the scene.
+
+    The artist's session only waits for the scene export. The rendered frames are shown
+    in the viewport every PROGRESS_STEP of the range, the worker adds the movie to the
+    outbox and the upload is queued here once it exits.
+    """
+    PROGRESS_STEP = 0.25
+
+    def __init__(self, outbox, task_id, comment_text, start_frame, end_frame, status_short_name='wfa',
+                 width=1920, height=1080):
+        self.outbox = outbox
+        self.temp_dir = tempfile.mkdtemp(prefix='kitsu_background_')
+        self.scene_file = str(cmds.file(query=True, sceneName=True))
+        scene_copy = save_scene_copy(self.temp_dir)
+        self.frame_count = int(end_frame) - int(start_frame) + 1
+        self.frames_done = 0
+        self.process = None
+        self.thread = None
+
+        self.args = {
+            'scene': scene_copy,
+            'scene_file': self.scene_file,
+            'workspace': cmds.workspace(query=True, rootDirectory=True),
+            'camera': active_camera(),
+            'start_frame': start_frame,
+            'end_frame': end_frame,
+            'width': width,
+            'height': height,
+            'output_name': os.path.splitext(os.path.basename(scene_copy))[0] + '_playblast.mov',
+            'task_id': task_id,
+            'comment_text': comment_text,
+            'status_short_name': status_short_name,
+            'outbox_folder': outbox.folder,
+        }
+        self.args_file = os.path.join(self.temp_dir, 'job_args.json')
+        with open(self.args_file, 'w') as file:
+            json.dump(self.args, file, indent=4)
+
+    def start(self):
+        creationflags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+        self.process = subprocess.Popen(
+            [mayapy_executable(), os.path.join(kitsu_path, 'playblast_worker.py'), self.args_file],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, creationflags=creationflags
+        )
+        self.thread = threading.Thread(target=self._watch, daemon=True)
+        self.thread.start()
+
+    def _watch(self):
+        job_id = None
+        output = []
+        name = os.path.basename(self.scene_file) or 'untitled'
+        step = max(int(self.frame_count * self.PROGRESS_STEP), 1)
+        for line in self.process.stdout:
+            line = line.strip()
+            if line.startswith('KITSU_FRAME'):
+                self.frames_done += 1
+                if self.frames_done % step == 0 and self.frames_done < self.frame_count:
+                    maya.utils.executeDeferred(notify_progress, name, self.frames_done, self.frame_count)
+            elif line.startswith('KITSU_JOB'):
+                job_id = line.split()[1]
+            else:
+                output.append(line)
+        self.process.wait()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+        job = self.outbox.load_job(job_id) if job_id else None
+        if job:
+            self.outbox.enqueue(job)
+        else:
+            message = 'Background playblast failed : ' + ('\n'.join(output[-5:]) or str(self.process.returncode))
+            maya.utils.executeDeferred(notify_in_viewport, {'id': os.path.basename(self.scene_file)}, False, message)
@@ -0,0 +1,225 @@
+import os, sys
+import json
+import sqlite3
+import threading
+import time
+
+import gazu
+
+
+def shared_config_dir():
+    """ Folder shared by every kitsu-connect front-end (standalone, Nuke and Maya) """
+    if sys.platform == "win32":
+        base = os.environ.get('APPDATA', os.path.expanduser('~'))
+    elif sys.platform == "darwin":
+        base = os.path.expanduser('~/Library/Application Support')
+    else:
+        base = os.environ.get('XDG_CONFIG_HOME', os.path.expanduser('~/.config'))
+    folder = os.path.join(base, 'kitsu-connect')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+class KitsuCache:
+    """
+    Local SQLite copy of the Kitsu records every publisher needs at startup.
+
+    Projects, task statuses, task types and tasks are read from disk and kept up to
+    date with the Kitsu event log (gazu.sync.get_last_events). Small reference lists
+    are refetched whole when an event touches them, tasks are patched one by one.
+    Lists that depend on who is logged in are kept per user.
+    """
+    EVENTS_PAGE_SIZE = 5000
+    MAX_AGE = 3600  # Seconds before a list is refetched when the event log is not readable
+    USER_KINDS = ('projects', 'tasks_to_do')  # Lists of the logged in user, refetched on every sync without events
+
+    def __init__(self, host=None, db_path=None, user_id=None):
+        self.host = host or gazu.client.get_host()
+        self._user_id = user_id
+        self.db_path = db_path or os.path.join(shared_config_dir(), 'kitsu_cache.db')
+        self.lock = threading.RLock()
+
+        self.connection = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS records ('
+                'host TEXT, kind TEXT, scope TEXT, id TEXT, updated_at TEXT, data TEXT, '
+                'PRIMARY KEY (host, kind, scope, id))'
+            )
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS sync_state ('
+                'host TEXT, kind TEXT, scope TEXT, value TEXT, loaded_at REAL, '
+                'PRIMARY KEY (host, kind, scope))'
+            )
+
+    @property
+    def user_id(self):
+        """ Id of the logged in user, scope of the projects and to-do lists """
+        if self._user_id is None:
+            self._user_id = gazu.client.get_current_user()['id']
+        return self._user_id
+
+    # Low level storage
+
+    def get(self, kind, scope=''):
+        """ Return the cached records of a kind, or None if they were never loaded """
+        with self.lock:
+            if self.get_state(kind, scope) is None:
+                return None
+            rows = self.connection.execute(
+                'SELECT data FROM records WHERE host=? AND kind=? AND scope=?',
+                (self.host, kind, scope)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def replace(self, kind, records, scope=''):
+        with self.lock, self.connection:
+            self.connection.execute(
+                'DELETE FROM records WHERE host=? AND kind=? AND scope=?', (self.host, kind, scope)
+            )
+            self._insert(kind, records, scope)
+            self._set_state(kind, scope, 'loaded')
+
+    def upsert(self, kind, records, scope=''):
+        with self.lock, self.connection:
+            self._insert(kind, records, scope)
+
+    def delete(self, kind, record_id):
+        with self.lock, self.connection:
+            self.connection.execute(
+                'DELETE FROM records WHERE host=? AND kind=? AND id=?', (self.host, kind, record_id)
+            )
+
+    def invalidate(self, kind, scope=None):
+        """ Forget a kind so it is fully fetched again on next read """
+        with self.lock, self.connection:
+            if scope is None:
+                self.connection.execute('DELETE FROM sync_state WHERE host=? AND kind=?', (self.host, kind))
+            else:
+                self.connection.execute(
+                    'DELETE FROM sync_state WHERE host=? AND kind=? AND scope=?', (self.host, kind, scope)
+                )
+
+    def get_state(self, kind, scope=''):
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT value, loaded_at FROM sync_state WHERE host=? AND kind=? AND scope=?',
+                (self.host, kind, scope)
+            ).fetchone()
+        return row
+
+    def _set_state(self, kind, scope, value):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?, ?)',
+            (self.host, kind, scope, value, time.time())
+        )
+
+    def _insert(self, kind, records, scope):
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?)',
+            [
+                (self.host, kind, scope, record['id'], record.get('updated_at'), json.dumps(record))
+                for record in records
+            ]
+        )
+
+    def fetch(self, kind, loader, scope=''):
+        """ Return the cached records of a kind, calling loader() to fill the cache on first use """
+        records = self.get(kind, scope)
+        if records is None:
+            records = loader()
+            self.replace(kind, records, scope)
+        return records
+
+    # Cached gazu calls
+
+    def all_open_projects(self):
+        return self.fetch('projects', gazu.project.all_open_projects, scope=self.user_id)
+
+    def all_task_statuses(self):
+        return self.fetch('task_statuses', gazu.task.all_task_statuses)
+
+    def all_task_types(self):
+        return self.fetch('task_types', gazu.task.all_task_types)
+
+    def all_tasks_to_do(self):
+        return self.fetch('tasks_to_do', gazu.user.all_tasks_to_do, scope=self.user_id)
+
+    def all_tasks_for_project(self, project):
+        return self.fetch(
+            'tasks',
+            lambda: gazu.client.fetch_all('tasks', params={'project_id': project['id']}),
+            scope=project['id']
+        )
+
+    # Delta sync
+
+    def sync(self):
+        """ Apply the Kitsu events that happened since the last sync """
+        try:
+            self._sync_events()
+        except Exception as eee:
+            # The event log is not readable by everyone, fall back on the age of each list.
+            # The to-do list and projects are what the artist refreshes for, those are always refetched.
+            print(f'Kitsu cache: cannot read events ({eee}), refreshing old records')
+            with self.lock, self.connection:
+                self.connection.execute(
+                    'DELETE FROM sync_state WHERE host=? AND kind != ? AND loaded_at < ?',
+                    (self.host, 'events', time.time() - self.MAX_AGE)
+                )
+            for kind in self.USER_KINDS:
+                self.invalidate(kind)
+
+    def _sync_events(self):
+        state = self.get_state('events')
+        if state is None:
+            # Nothing to apply deltas to yet, start over from the current end of the event log
+            events = gazu.sync.get_last_events(page_size=1)
+            with self.lock, self.connection:
+                self.connection.execute('DELETE FROM sync_state WHERE host=?', (self.host,))
+                self.connection.execute('DELETE FROM records WHERE host=?', (self.host,))
+                self._set_state('events', '', events[0]['created_at'][:19] if events else None)
+            return
+
+        last_sync = state[0]
+        events = gazu.sync.get_last_events(page_size=self.EVENTS_PAGE_SIZE, after=last_sync)
+        if not events:
+            return
+        if len(events) >= self.EVENTS_PAGE_SIZE:
+            # Too far behind to catch up event by event
+            with self.lock, self.connection:
+                self.connection.execute('DELETE FROM sync_state WHERE host=?', (self.host,))
+            self.sync()
+            return
+
+        stale_kinds = set()
+        changed_tasks = {}
+        # Events come newest first
+        for event in reversed(events):
+            name = event['name']
+            data = event.get('data') or {}
+            model = name.split(':')[0]
+            if model == 'project':
+                stale_kinds.add('projects')
+            elif model == 'task-status':
+                stale_kinds.add('task_statuses')
+            elif model == 'task-type':
+                stale_kinds.add('task_types')
+            elif model == 'task' and data.get('task_id'):
+                changed_tasks[data['task_id']] = name
+                stale_kinds.add('tasks_to_do')
+
+        for kind in stale_kinds:
+            self.invalidate(kind)
+
+        for task_id, name in changed_tasks.items():
+            self.delete('tasks', task_id)
+            if name == 'task:delete':
+                continue
+            task = gazu.client.fetch_one('tasks', task_id)
+            if self.get_state('tasks', task['project_id']) is not None:
+                self.upsert('tasks', [task], scope=task['project_id'])
+
+        with self.lock, self.connection:
+            self._set_state('events', '', events[0]['created_at'][:19])
@@ -0,0 +1,93 @@
+"""
+Renders a playblast of a saved scene in a headless mayapy and adds it to the publish outbox.
+
+    mayapy playblast_worker.py job_args.json
+
+Prints KITSU_FRAME n after each frame and KITSU_JOB <job id> once the movie is in the outbox.
+"""
+import os, sys
+import json
+import shutil
+import tempfile
+import subprocess
+
+kitsu_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(kitsu_path)
+sys.path.append(os.path.join(kitsu_path, 'site-packages'))
+
+
+def render_movie(args, output_file, ffmpeg):
+    """ Render each frame with ogsRender and pipe the images into ffmpeg as they come """
+    import maya.cmds as cmds
+    import maya.mel as mel
+    from viewport_capture import WIDTH, HEIGHT
+
+    frames_dir = tempfile.mkdtemp(prefix='kitsu_frames_')
+    cmds.setAttr('defaultRenderGlobals.imageFormat', 32)  # png
+    cmds.setAttr('defaultRenderGlobals.imageFilePrefix', os.path.join(frames_dir, 'frame'), type='string')
+    cmds.setAttr('defaultRenderGlobals.animation', 0)
+
+    creationflags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+    process = subprocess.Popen([
+        ffmpeg, '-y', '-loglevel', 'error',
+        '-f', 'image2pipe', '-r', str(mel.eval('currentTimeUnitToFPS()')), '-i', 'pipe:0',
+        '-vf', f'scale={WIDTH}:{HEIGHT}:force_original_aspect_ratio=decrease,pad={WIDTH}:{HEIGHT}:(ow-iw)/2:(oh-ih)/2',
+        '-c:v', 'libx264', '-preset', 'fast', '-crf', '18', '-pix_fmt', 'yuv420p',
+        output_file
+    ], stdin=subprocess.PIPE, creationflags=creationflags)
+
+    try:
+        for frame in range(int(args['start_frame']), int(args['end_frame']) + 1):
+            cmds.currentTime(frame)
+            image = cmds.ogsRender(camera=args['camera'], width=args['width'], height=args['height'], currentFrame=True)
+            with open(image, 'rb') as file:
+                process.stdin.write(file.read())
+            os.remove(image)
+            print(f'KITSU_FRAME {frame}', flush=True)
+    finally:
+        process.stdin.close()
+        shutil.rmtree(frames_dir, ignore_errors=True)
+    return process.wait()
+
+
+def main(args_file):
+    with open(args_file, 'r') as file:
+        args = json.load(file)
+
+    import maya.standalone
+    maya.standalone.initialize(name='python')
+    try:
+        import maya.cmds as cmds
+        from viewport_capture import find_ffmpeg
+        from publish_outbox import PublishOutbox
+
+        ffmpeg = find_ffmpeg()
+        if not ffmpeg:
+            print('ffmpeg not found', file=sys.stderr)
+            return 1
+
+        # Project relative paths of references and textures resolve against the artist's workspace
+        if args.get('workspace'):
+            cmds.workspace(args['workspace'], openWorkspace=True)
+        cmds.file(args['scene'], open=True, force=True)
+        output_file = os.path.join(os.path.dirname(args['scene']), args['output_name'])
+        if render_movie(args, output_file, ffmpeg) != 0:
+            print('ffmpeg failed', file=sys.stderr)
+            return 1
+
+        # The session that started us queues the upload, or the next one resumes it
+        job = PublishOutbox(args['outbox_folder']).add_job(
+            args['task_id'],
+            args['comment_text'],
+            output_file,
+            status_short_name=args['status_short_name'],
+            scene_file=args['scene_file']
+        )
+        print(f"KITSU_JOB {job['id']}", flush=True)
+        return 0
+    finally:
+        maya.standalone.uninitialize()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1]))
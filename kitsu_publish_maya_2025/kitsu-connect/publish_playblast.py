@@ -25,7 +25,13 @@ sys.path.append(os.path.join(kitsu_path, 'site-packages'))
 
 
 from settings import Kitsu_Settings
-import gazu
+from kitsu_cache import KitsuCache
+from publish_outbox import shared_outbox
+from viewport_capture import capture_to_movie
+from background_playblast import BackgroundPlayblast
+from sequencer_batch import sequencer_shots, build_task_index, match_shots, describe_match
+
+REVIEW_STATUS = 'wfa'  # Short name of the status set by a publish
 
 class KitsuItem(QtWidgets.QTreeWidgetItem):
     def __init__(self, parent, text, id=None):
@@ -54,14 +60,23 @@ class publish_playblast_window(QtWidgets.QMainWindow):
         self.load_ui(self.ui_file)
         self.settings = Kitsu_Settings()
         self.settings.check_connection()
+        # Startup reads from the local cache and only fetches what changed on Kitsu
+        self.cache = KitsuCache()
+        self.cache.sync()
+        # Uploads left over from a previous session start again as soon as we are logged in
+        self.outbox = shared_outbox()
         self.populate_tasks()
         self.ui.publish_button.setEnabled(False)
+        self.ui.batch_button.setEnabled(False)
         
         self.ui.task_tree.itemDoubleClicked.connect(self.set_context)
         self.ui.publish_button.released.connect(self.publish_playblast)
+        self.ui.batch_button.released.connect(self.publish_sequencer_shots)
 
     def populate_tasks(self):
-        tasks = gazu.user.all_tasks_to_do()
+        tasks = self.cache.all_tasks_to_do()
+        self.tasks = {task['id']: task for task in tasks}
+        self.task_index = build_task_index(tasks)  # Name index for the sequencer batch
         
         data = {}
         for task in tasks:
@@ -118,10 +133,12 @@ class publish_playblast_window(QtWidgets.QMainWindow):
             self.context_id = item.ID
             self.ui.context_id.setText(item.ID)
             self.ui.publish_button.setEnabled(True)
+            self.ui.batch_button.setEnabled(True)
         else:
             self.context_id = None
             self.ui.context_id.setText(item.ID)
             self.ui.publish_button.setEnabled(False)
+            self.ui.batch_button.setEnabled(False)
         
         
     def load_ui(self, ui_file):
@@ -132,9 +149,9 @@ class publish_playblast_window(QtWidgets.QMainWindow):
         path.close()
 
 
-    def create_playblast_in_temp(self):
+    def create_playblast_in_temp(self, start_frame=None, end_frame=None, suffix='', panel=None):
         # Get the current scene name (without extension)
-        scene_name = cmds.file(q=True, sceneName=True, shortName=True).rsplit(".", 1)[0]
+        scene_name = cmds.file(q=True, sceneName=True, shortName=True).rsplit(".", 1)[0] + suffix
         
         # Create a temporary directory
         temp_dir = tempfile.mkdtemp()
@@ -144,9 +161,21 @@ class publish_playblast_window(QtWidgets.QMainWindow):
         output_file = os.path.join(temp_dir, f"{scene_name}_playblast_{timestamp}")
         
         # Get the current time slider range
-        start_frame = cmds.playbackOptions(q=True, minTime=True)
-        end_frame = cmds.playbackOptions(q=True, maxTime=True)
+        if start_frame is None:
+            start_frame = cmds.playbackOptions(q=True, minTime=True)
+            end_frame = cmds.playbackOptions(q=True, maxTime=True)
         
+        # Both capture paths draw the given panel, the active one otherwise
+        panel_args = {'editorPanelName': panel} if panel else {}
+
+        # Stream the viewport straight into ffmpeg, no intermediate file
+        if self.ui.stream_capture.isChecked():
+            playblast_file = capture_to_movie(output_file+'.mov', start_frame, end_frame, panel=panel)
+            if playblast_file:
+                print(f"Viewport captured successfully: {playblast_file}")
+                return playblast_file
+            print("Falling back to playblast...")
+
         # Try to create the playblast
         try:
             playblast_file = cmds.playblast(
@@ -162,7 +191,8 @@ class publish_playblast_window(QtWidgets.QMainWindow):
                 viewer=False,
                 percent=100,
                 clearCache=True,
-                offScreen=True
+                offScreen=True,
+                **panel_args
             )
             print(f"Playblast created successfully: {playblast_file}")
             return playblast_file
@@ -185,7 +215,8 @@ class publish_playblast_window(QtWidgets.QMainWindow):
                     viewer=False,
                     percent=100,
                     clearCache=True,
-                    offScreen=True
+                    offScreen=True,
+                    **panel_args
                 )
                 print(f"Playblast created successfully with alternative method: {playblast_file}")
                 return playblast_file
@@ -219,38 +250,99 @@ class publish_playblast_window(QtWidgets.QMainWindow):
         
         return result
 
+    def review_status_exists(self):
+        """ The publish status has to exist on Kitsu before anything is rendered """
+        status = next((s for s in self.cache.all_task_statuses() if s['short_name'] == REVIEW_STATUS), None)
+        if status is None:
+            self.show_message_box("Information", f"Failed to Submit : there is no '{REVIEW_STATUS}' task status on kitsu")
+        return status is not None
+
     def publish_playblast(self):
         try:
+            if not self.review_status_exists():
+                return False
+            if self.ui.background_playblast.isChecked():
+                return self.publish_in_background()
 
             playblast_file = self.create_playblast_in_temp()
+            if not playblast_file:
+                self.show_message_box("Information", "Failed to Submit : the playblast could not be created")
+                return False
 
-            status = gazu.task.get_task_status_by_short_name("wfa")
-            task = gazu.task.get_task(self.context_id)
-            file_string = '\n\n<hr><b><u>SCENE FILE :\n</b></u><i>' + str(cmds.file(query=True, sceneName=True))+ '\n\n</i><b><u>FILE :</b></u><i>\n' + str(playblast_file) + '</i>\n'
-            comment = gazu.task.add_comment(task, status, self.ui.comment_box.toPlainText()+file_string)
-
-            preview_file = gazu.task.add_preview(
-                    task,
-                    comment,
-                    playblast_file
-                )
-
-            # Remove the temporary playblast file
-            if os.path.exists(playblast_file):
-                os.remove(playblast_file)
-                print(f"Temporary playblast file deleted: {playblast_file}")
-            else:
-                print("Temporary playblast file not found.")
+            # The upload runs in the background, the artist gets Maya back right after the playblast
+            scene_file = str(cmds.file(query=True, sceneName=True))
+            file_string = '\n\n<hr><b><u>SCENE FILE :\n</b></u><i>' + scene_file + '\n\n</i><b><u>FILE :</b></u><i>\n' + str(playblast_file) + '</i>\n'
+            self.outbox.submit(
+                self.context_id,
+                self.ui.comment_box.toPlainText()+file_string,
+                playblast_file,
+                status_short_name=REVIEW_STATUS,
+                scene_file=scene_file
+            )
 
-            
-            self.show_message_box("Succes", "Submitted to kitsu !")
+            self.show_message_box("Succes", "Queued for kitsu, you will be notified when the upload is done.")
             return True
         except Exception as eee:
             self.show_message_box("Information", "Failed to Submit : "+ str(eee))
             return False
 
+    def publish_in_background(self):
+        # Only the scene export blocks Maya, a headless mayapy renders and hands the movie to the outbox
+        scene_file = str(cmds.file(query=True, sceneName=True))
+        file_string = '\n\n<hr><b><u>SCENE FILE :\n</b></u><i>' + scene_file + '</i>\n'
+        job = BackgroundPlayblast(
+            self.outbox,
+            self.context_id,
+            self.ui.comment_box.toPlainText()+file_string,
+            cmds.playbackOptions(q=True, minTime=True),
+            cmds.playbackOptions(q=True, maxTime=True),
+            status_short_name=REVIEW_STATUS
+        )
+        job.start()
+        self.show_message_box("Succes", "Rendering in the background, you will be notified when it is on kitsu.")
+        return True
 
+    def publish_sequencer_shots(self):
+        """ Playblast every camera sequencer shot and queue it on the task of the same type in its shot """
+        context = self.tasks.get(self.context_id)
+        if not context or context.get('task_type_for_entity') == 'Asset':
+            self.show_message_box("Information", "Select a shot task, its sequence and task type are used for every shot.")
+            return False
 
- 
-    
+        matched, unmatched = match_shots(sequencer_shots(), self.task_index, context['sequence_name'], context['task_type_name'])
+        if not matched:
+            self.show_message_box("Information", describe_match(matched, unmatched))
+            return False
+        if not self.review_status_exists():
+            return False
+        if self.show_message_box("Publish Camera Sequencer", describe_match(matched, unmatched), ["Publish", "Cancel"]) != "Publish":
+            return False
+
+        # Playblasts run one after the other in Maya, the outbox uploads them on its pool meanwhile
+        panel = cmds.playblast(activeEditor=True).split('|')[-1]
+        camera = cmds.modelPanel(panel, query=True, camera=True)
+        scene_file = str(cmds.file(query=True, sceneName=True))
+        failed = []
+        try:
+            for shot, task in matched:
+                cmds.lookThru(panel, shot['camera'])
+                playblast_file = self.create_playblast_in_temp(shot['start_frame'], shot['end_frame'], '_' + shot['name'], panel)
+                if not playblast_file:
+                    failed.append(shot['name'])
+                    continue
+                file_string = '\n\n<hr><b><u>SCENE FILE :\n</b></u><i>' + scene_file + '\n\n</i><b><u>SHOT :</b></u><i>\n' + shot['node'] + '</i>\n'
+                self.outbox.submit(
+                    task['id'],
+                    self.ui.comment_box.toPlainText()+file_string,
+                    playblast_file,
+                    status_short_name=REVIEW_STATUS,
+                    scene_file=scene_file
+                )
+        finally:
+            cmds.lookThru(panel, camera)
 
+        message = f"{len(matched) - len(failed)} shots queued for kitsu."
+        if failed:
+            message += "\n\nPlayblast failed for : " + ', '.join(failed)
+        self.show_message_box("Succes", message)
+        return not failed
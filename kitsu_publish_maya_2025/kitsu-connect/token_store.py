@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import base64
+import threading
+
+import gazu
+from gazu.exception import NotAuthenticatedException, ParameterException
+
+try:
+    from core.kitsu_cache import shared_config_dir  # Nuke
+    from core.thread_client import clone_client
+except ImportError:
+    from kitsu_cache import shared_config_dir  # Standalone and Maya
+    from thread_client import clone_client
+
+
+REFRESH_MARGIN = 300  # Seconds before expiry the access token is refreshed
+
+
+def token_expiry(access_token):
+    """ Expiry timestamp read from the JWT payload, None if it can't be read """
+    try:
+        payload = access_token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload))['exp']
+    except Exception:
+        return None
+
+
+class TokenStore:
+    """
+    Access and refresh tokens per Kitsu host, shared by every kitsu-connect front-end.
+
+    A window restores the stored tokens instead of logging in again, so the password is
+    only sent when the refresh token itself is no longer accepted.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(shared_config_dir(), 'tokens.json')
+        self.lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, data):
+        temp_path = self.path + '.tmp'
+        handle = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)  # Readable by the user only
+        with os.fdopen(handle, 'w') as file:
+            json.dump(data, file, indent=4)
+        os.replace(temp_path, self.path)
+
+    def load(self, host):
+        return self._read().get(host)
+
+    def save(self, host, user, tokens):
+        with self.lock:
+            data = self._read()
+            data[host] = {
+                'user': user,
+                'access_token': tokens['access_token'],
+                'refresh_token': tokens.get('refresh_token') or data.get(host, {}).get('refresh_token'),
+                'expires_at': token_expiry(tokens['access_token']),
+            }
+            self._write(data)
+
+    def forget(self, host):
+        with self.lock:
+            data = self._read()
+            if data.pop(host, None) is not None:
+                self._write(data)
+
+
+_store = None
+_timers = {}
+_tokens_lock = threading.Lock()  # Guards the tokens of clients refreshed from a timer thread
+
+
+def shared_store():
+    global _store
+    if _store is None:
+        _store = TokenStore()
+    return _store
+
+
+def restore_session(host, user=None, store=None, client=gazu.client.default_client):
+    """
+    Log the client in with the stored tokens of host.
+
+    One get_current_user call checks the tokens. A rejected access token is refreshed,
+    and the entry is forgotten when the refresh token is rejected too.
+
+    Returns:
+        bool: False when there are no usable tokens for host and user, the caller then
+        falls back to a login with the password.
+    """
+    store = store or shared_store()
+    entry = store.load(host)
+    if not entry or not entry.get('refresh_token') or (user and entry.get('user') != user):
+        return False
+
+    gazu.client.set_host(host, client=client)
+    gazu.client.set_tokens({'access_token': entry['access_token'], 'refresh_token': entry['refresh_token']}, client=client)
+    expires_at = entry.get('expires_at')
+    try:
+        if expires_at is not None and expires_at - time.time() < REFRESH_MARGIN:
+            raise NotAuthenticatedException()
+        gazu.client.get_current_user(client=client)
+    except (NotAuthenticatedException, ParameterException):
+        # Expired or revoked, logged out elsewhere or password changed
+        if not refresh(host, store, client):
+            store.forget(host)
+            return False
+    except Exception as eee:
+        print(f'Kitsu token check failed : {eee}')
+        return False
+
+    schedule_refresh(host, store, client)
+    return True
+
+
+def log_in(host, user, password, store=None, client=gazu.client.default_client):
+    """ Password login, the tokens are stored for the next windows """
+    store = store or shared_store()
+    gazu.client.set_host(host, client=client)
+    tokens = gazu.log_in(user, password, client=client)
+    store.save(host, user, tokens)
+    schedule_refresh(host, store, client)
+    return tokens
+
+
+def refresh(host, store=None, client=gazu.client.default_client):
+    """
+    Get a new access token with the refresh token and store it.
+
+    The request goes through a clone of client, its requests session may be in use
+    by another thread, and the new token is copied back under a lock.
+    """
+    store = store or shared_store()
+    with _tokens_lock:
+        refresh_client = clone_client(client)
+    try:
+        tokens = gazu.refresh_token(client=refresh_client)
+    except Exception as eee:
+        print(f'Kitsu token refresh failed : {eee}')
+        return False
+    with _tokens_lock:
+        client.tokens['access_token'] = tokens['access_token']
+        new_tokens = dict(client.tokens)
+    entry = store.load(host) or {}
+    store.save(host, entry.get('user'), new_tokens)
+    schedule_refresh(host, store, client)
+    return True
+
+
+def schedule_refresh(host, store=None, client=gazu.client.default_client):
+    """ Refresh the access token in the background a little before it expires """
+    store = store or shared_store()
+    with _tokens_lock:
+        expires_at = token_expiry(client.tokens.get('access_token', ''))
+    if expires_at is None:
+        return
+    previous = _timers.pop(id(client), None)
+    if previous:
+        previous.cancel()
+    timer = threading.Timer(max(expires_at - time.time() - REFRESH_MARGIN, 0), refresh, (host, store, client))
+    timer.daemon = True
+    timer.start()
+    _timers[id(client)] = timer
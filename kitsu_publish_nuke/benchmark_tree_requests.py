@@ -0,0 +1,104 @@
+"""
+Count the Kitsu requests made to load the shots of a sequence, at several shot counts.
+
+    python benchmark_tree_requests.py --shots 10 100 1000 --tasks-per-shot 6
+
+A local http.server stub answers the /data routes with synthetic shots and tasks, so
+the count is the number of requests gazu really sends. The model's _load_sequence is
+measured too when PySide2 is importable.
+"""
+import argparse
+import json
+import os, sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+folder_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(folder_path)
+sys.path.append(os.path.join(folder_path, 'site-packages'))
+
+import gazu
+
+from core.tree_loader import load_sequence_shots
+
+try:
+    from core.task_tree_model import TaskTreeModel
+except ImportError:  # Outside Nuke
+    TaskTreeModel = None
+
+
+TASK_TYPES = {f'task-type-{index}': f'Task type {index}' for index in range(8)}
+
+
+class StubKitsu(BaseHTTPRequestHandler):
+    shot_count = 0
+    tasks_per_shot = 0
+    requests = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            self.requests.append(self.path)
+        parts = self.path.split('?')[0].strip('/').split('/')  # api/data/sequences/<id>/<shots|tasks>
+        if parts[1:3] == ['data', 'sequences'] and parts[-1] == 'shots':
+            body = [{'id': f'shot-{index}', 'name': f'SH{index:04d}'} for index in range(self.shot_count)]
+        elif parts[1:3] == ['data', 'sequences'] and parts[-1] == 'tasks':
+            body = [
+                {
+                    'id': f'task-{shot}-{index}',
+                    'name': 'main',
+                    'entity_id': f'shot-{shot}',
+                    'task_type_id': f'task-type-{index % len(TASK_TYPES)}',
+                }
+                for shot in range(self.shot_count) for index in range(self.tasks_per_shot)
+            ]
+        else:
+            self.send_error(404)
+            return
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def measure(label, load):
+    del StubKitsu.requests[:]
+    start = time.time()
+    shots = load()
+    elapsed = time.time() - start
+    print(f'{label:<30} {len(shots):>6} shots  {len(StubKitsu.requests):>3} requests  {elapsed:6.2f}s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shots', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--tasks-per-shot', type=int, default=6)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubKitsu)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    gazu.client.set_host(f'http://127.0.0.1:{server.server_address[1]}/api')
+    gazu.client.set_tokens({'access_token': 'benchmark'})
+
+    model = TaskTreeModel([], TASK_TYPES) if TaskTreeModel else None
+    if model is None:
+        print('PySide2 not found, only load_sequence_shots is measured')
+
+    sequence = {'id': 'sequence-0', 'name': 'SQ0010'}
+    try:
+        for shot_count in args.shots:
+            StubKitsu.shot_count = shot_count
+            StubKitsu.tasks_per_shot = args.tasks_per_shot
+            measure(f'load_sequence_shots ({shot_count})', lambda: load_sequence_shots(sequence, TASK_TYPES))
+            if model is not None:
+                measure(f'_load_sequence ({shot_count})', lambda: model._load_sequence(sequence))
+    finally:
+        if model is not None:
+            model.shutdown()
+        server.shutdown()
@@ -0,0 +1,214 @@
+import os, sys
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import nuke
+
+from PySide2.QtCore import QObject, Signal
+
+
+RENDER_WORKER = os.path.join(os.path.dirname(__file__), 'render_worker.py')
+
+MIN_CHUNK_FRAMES = 10  # Shorter chunks spend more time loading the script than rendering
+
+
+def save_script_copy(file_path):
+    """ Save the current script to file_path without renaming the session or touching its modified flag """
+    if hasattr(nuke, 'scriptSaveToTemp'):
+        nuke.scriptSaveToTemp(file_path)
+        return
+
+    root = nuke.root()
+    name = root['name'].value()
+    modified = root.modified()
+    nuke.scriptSaveAs(file_path, overwrite=1)
+    root['name'].setValue(name)
+    root.setModified(modified)
+
+
+def split_frame_range(first_frame, last_frame, chunks):
+    """ Split first_frame..last_frame into at most chunks contiguous (first, last) ranges """
+    count = last_frame - first_frame + 1
+    chunks = max(1, min(chunks, count // MIN_CHUNK_FRAMES))
+    size, extra = divmod(count, chunks)
+    ranges = []
+    start = first_frame
+    for index in range(chunks):
+        end = start + size + (1 if index < extra else 0) - 1
+        ranges.append((start, end))
+        start = end + 1
+    return ranges
+
+
+class BackgroundRender(QObject):
+    """
+    Renders a Write node in a headless Nuke process (nuke -t) from a saved copy of the script.
+
+    Signals are emitted from a worker thread, connected slots run on the GUI thread.
+    """
+    frame_rendered = Signal(int, int)  # Frames done, total frames
+    render_finished = Signal(bool, str)  # Success, output file or error message
+
+    def __init__(self, write_node, first_frame, last_frame, output_file):
+        QObject.__init__(self)
+        self.write_name = write_node.fullName()
+        self.first_frame = int(first_frame)
+        self.last_frame = int(last_frame)
+        self.total_frames = self.last_frame - self.first_frame + 1
+        self.output_file = output_file
+        self.is_cancelled = False
+        self.processes = []
+        self.lock = threading.Lock()
+        self.frames_done = 0
+        self.output_tail = deque(maxlen=20)  # Last lines printed by Nuke, reported if the render fails
+        self.done = threading.Event()
+        self.result = None
+
+        # The copy is saved right away, later edits in the session do not change the render
+        self.temp_dir = tempfile.mkdtemp()
+        self.script_path = os.path.join(self.temp_dir, 'kitsu_preview_render.nk')
+        save_script_copy(self.script_path)
+
+    def start(self):
+        threading.Thread(target=self._run_and_finish, daemon=True).start()
+
+    def wait(self):
+        """ Block until the render is done and return (success, output file or error message) """
+        self.done.wait()
+        return self.result
+
+    def cancel(self):
+        self.is_cancelled = True
+        with self.lock:
+            for process in self.processes:
+                if process.poll() is None:
+                    process.kill()
+
+    def _run(self):
+        return self._run_worker('render', self.first_frame, self.last_frame)
+
+    def _run_and_finish(self):
+        try:
+            success = self._run()
+        finally:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+        if self.is_cancelled:
+            self.result = (False, 'Render cancelled')
+        elif success and os.path.exists(self.output_file):
+            self.result = (True, self.output_file)
+        else:
+            self.result = (False, '\n'.join(self.output_tail) or 'The background render failed')
+        self.done.set()
+        self.render_finished.emit(*self.result)
+
+    def _run_worker(self, mode, first_frame, last_frame, sequence=None, threads=None, count_frames=True):
+        """ Run render_worker.py in a headless Nuke and return True if it completed """
+        cmd = [nuke.EXE_PATH]
+        if threads:
+            cmd += ['-m', str(threads)]
+        cmd += ['-t', RENDER_WORKER, mode, self.script_path, self.write_name, str(first_frame), str(last_frame)]
+        if sequence:
+            cmd.append(sequence)
+
+        creationflags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+        with self.lock:
+            if self.is_cancelled:
+                return False
+            process = subprocess.Popen(
+                cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True,
+                creationflags=creationflags
+            )
+            self.processes.append(process)
+
+        finished = False
+        for line in process.stdout:
+            line = line.strip()
+            if line.startswith('KITSU_FRAME'):
+                if count_frames:
+                    with self.lock:
+                        self.frames_done += 1
+                        done = self.frames_done
+                    self.frame_rendered.emit(done, self.total_frames)
+            elif line == 'KITSU_DONE':
+                finished = True
+            elif line:
+                with self.lock:
+                    self.output_tail.append(line)
+        process.wait()
+        return finished and process.returncode == 0
+
+
+class SplitRender(BackgroundRender):
+    """
+    Renders chunks of the frame range as a 16 bit png sequence in parallel headless Nuke processes,
+    then encodes the sequence into the movie with the Write node's settings in a last process.
+    The sequence is lossless so the movie is only compressed once, as a single render would.
+    """
+
+    def __init__(self, write_node, first_frame, last_frame, output_file, workers=None):
+        BackgroundRender.__init__(self, write_node, first_frame, last_frame, output_file)
+        cpu_count = os.cpu_count() or 1
+        self.chunks = split_frame_range(self.first_frame, self.last_frame, workers or cpu_count)
+        self.threads = max(1, cpu_count // len(self.chunks))  # Nuke threads per process
+        self.sequence = os.path.join(self.temp_dir, 'frames', 'frame.####.png').replace(os.sep, '/')
+        self.timings = {}
+
+    def _run(self):
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=len(self.chunks)) as executor:
+            results = list(executor.map(
+                lambda chunk: self._run_worker('render', chunk[0], chunk[1], self.sequence, self.threads),
+                self.chunks
+            ))
+        self.timings['render'] = time.time() - start
+        if not all(results) or self.is_cancelled:
+            return False
+
+        start = time.time()
+        success = self._run_worker(
+            'encode', self.first_frame, self.last_frame, self.sequence, count_frames=False
+        )
+        self.timings['encode'] = time.time() - start
+        print(self.timing_report())
+        return success
+
+    def timing_report(self):
+        render = self.timings.get('render', 0)
+        encode = self.timings.get('encode', 0)
+        return (
+            f'Split render of {self.total_frames} frames in {len(self.chunks)} processes '
+            f'({self.threads} threads each): render {render:.1f}s, encode {encode:.1f}s, '
+            f'total {render + encode:.1f}s ({self.total_frames / max(render + encode, 0.001):.1f} fps)'
+        )
+
+
+def benchmark_split_render(write_node, first_frame=None, last_frame=None, workers=None):
+    """
+    Time a single nuke.execute of the Write node against a SplitRender of the same range.
+    Meant to be run from the script editor, it blocks the session for both renders.
+    """
+    first_frame = int(first_frame if first_frame is not None else nuke.root()['first_frame'].value())
+    last_frame = int(last_frame if last_frame is not None else nuke.root()['last_frame'].value())
+    output_file = write_node['file'].value()
+
+    start = time.time()
+    nuke.execute(write_node, first_frame, last_frame)
+    single = time.time() - start
+
+    render = SplitRender(write_node, first_frame, last_frame, output_file, workers)
+    render.start()
+    success, result = render.wait()
+    split = sum(render.timings.values())
+
+    print(f'Single nuke.execute: {single:.1f}s')
+    print(render.timing_report())
+    if success:
+        print(f'Speedup: {single / max(split, 0.001):.2f}x')
+    else:
+        print(f'Split render failed: {result}')
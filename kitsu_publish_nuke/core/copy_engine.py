@@ -0,0 +1,159 @@
+import os
+import time
+import zlib
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from PySide2.QtCore import QThread, Signal
+
+
+MAX_WORKERS = 8  # Enough parallel frames to fill a NAS link without thrashing its disks
+BUFFER_SIZE = 8 * 1024 * 1024
+
+
+class CopyCancelled(Exception):
+    pass
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+def file_checksum(path, buffer_size=BUFFER_SIZE):
+    """ crc32 of a file, fast enough to verify plates at disk speed """
+    checksum = 0
+    with open(path, 'rb') as file:
+        buffer = bytearray(buffer_size)
+        view = memoryview(buffer)
+        while True:
+            size = file.readinto(buffer)
+            if not size:
+                break
+            checksum = zlib.crc32(view[:size], checksum)
+    return checksum
+
+
+def _kernel_copy(fsrc, fdst, size):
+    """ Copy inside the kernel, returns False if the platform or filesystem does not allow it """
+    source, destination = fsrc.fileno(), fdst.fileno()
+    copy = getattr(os, 'copy_file_range', None)
+    if copy is None and hasattr(os, 'sendfile') and os.name != 'nt':
+        copy = lambda src, dst, count: os.sendfile(dst, src, None, count)
+    if copy is None:
+        return False
+
+    copied = 0
+    try:
+        while copied < size:
+            sent = copy(source, destination, min(size - copied, 1 << 30))
+            if sent == 0:
+                break
+            copied += sent
+    except OSError:
+        if copied:
+            raise
+        return False  # Nothing written yet, the Python copy can take over
+    return copied == size
+
+
+def _checksum_copy(fsrc, fdst, buffer_size=BUFFER_SIZE):
+    """ Buffered copy returning the crc32 of what was read, so the source is only read once """
+    checksum = 0
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    while True:
+        size = fsrc.readinto(buffer)
+        if not size:
+            break
+        fdst.write(view[:size])
+        checksum = zlib.crc32(view[:size], checksum)
+    return checksum
+
+
+def copy_file(source, destination, verify=True, is_cancelled=None):
+    """
+    Copy one file with a kernel-side copy when available, else a buffered Python copy.
+
+    With verify, both files are checksummed after a kernel-side copy. The buffered copy
+    checksums the source as it reads it, so only the destination is read back.
+
+    Returns:
+        int: Bytes copied.
+    """
+    if is_cancelled and is_cancelled():
+        raise CopyCancelled()
+
+    size = os.stat(source).st_size
+    source_checksum = None
+    with open(source, 'rb') as fsrc, open(destination, 'wb') as fdst:
+        if not _kernel_copy(fsrc, fdst, size):
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+            if verify:
+                source_checksum = _checksum_copy(fsrc, fdst)
+            else:
+                shutil.copyfileobj(fsrc, fdst, BUFFER_SIZE)
+    shutil.copystat(source, destination)
+
+    if verify and source_checksum is None:
+        source_checksum = file_checksum(source)
+    if verify and file_checksum(destination) != source_checksum:
+        raise ChecksumMismatch(f'{destination} does not match {source}')
+    return size
+
+
+class CopyJob(QThread):
+    """
+    Copies a list of files on a thread pool, off the GUI thread.
+
+    Sequence frames are copied in parallel, each one is verified with a crc32 after the
+    copy and the aggregate throughput is reported with the progress.
+    """
+    copy_progress = Signal(int, int, object, float)  # Files done, total files, bytes done, bytes per second
+    copy_finished = Signal(bool, str)  # Success, message
+
+    def __init__(self, files, workers=MAX_WORKERS, verify=True, parent=None):
+        QThread.__init__(self, parent)
+        self.files = files  # [(source, destination), ...]
+        self.workers = workers
+        self.verify = verify
+        self.is_cancelled = False
+        self.bytes_copied = 0
+        self.elapsed = 0
+
+    def cancel(self):
+        self.is_cancelled = True
+
+    def run(self):
+        start = time.time()
+        errors = []
+        try:
+            for folder in {os.path.dirname(destination) for source, destination in self.files}:
+                os.makedirs(folder, exist_ok=True)
+        except OSError as eee:
+            self.copy_finished.emit(False, f'Cannot create the destination folder : {eee}')
+            return
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(self.files)))) as executor:
+            futures = {
+                executor.submit(copy_file, source, destination, self.verify, lambda: self.is_cancelled): source
+                for source, destination in self.files
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    self.bytes_copied += future.result()
+                except CopyCancelled:
+                    pass
+                except Exception as eee:
+                    errors.append(f'{os.path.basename(futures[future])} : {eee}')
+                elapsed = max(time.time() - start, 0.001)
+                self.copy_progress.emit(done, len(self.files), self.bytes_copied, self.bytes_copied / elapsed)
+
+        self.elapsed = time.time() - start
+        if self.is_cancelled:
+            self.copy_finished.emit(False, 'Copy cancelled')
+        elif errors:
+            self.copy_finished.emit(False, 'Some files could not be copied :\n\n' + '\n'.join(errors))
+        else:
+            self.copy_finished.emit(True, f'Copied {self.bytes_copied / 1048576:.0f} MB in {self.elapsed:.1f}s')
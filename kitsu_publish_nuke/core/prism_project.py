@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import tempfile
+
+
+class PrismLockTimeout(Exception):
+    pass
+
+
+class PrismProject:
+    """
+    Prism project folder seen from the timeline exporter.
+
+    shotInfo.json is read once and every shot change is kept in memory until save(),
+    which writes the file once, atomically, under a lock file shared by every exporter.
+    The Shots folder layout and the sourceplate version counts are cached as well.
+    """
+    LOCK_TIMEOUT = 30  # Seconds to wait for another exporter
+    STALE_LOCK = 120  # Seconds after which a lock left by a crashed exporter is ignored
+
+    def __init__(self, project_folder):
+        self.project_folder = project_folder
+        self.shot_info_dir = os.path.join(project_folder, '00_Pipeline', 'Shotinfo')
+        self.shot_info_path = os.path.join(self.shot_info_dir, 'shotInfo.json')
+        self.shots_folder = os.path.join(project_folder, '03_Production', 'Shots')
+
+        with open(self.shot_info_path, 'r') as file:
+            self.shot_info = json.load(file)
+        self.changes = []  # (sequence, shot, frame_in, frame_out, metadata) to replay on save
+
+        self.layout = None  # Sequence name > set of shot folder names
+        self.version_counts = {}  # Destination folder > number of version folders
+
+    # Shot info
+
+    def set_shot(self, sequence, shot_name, frame_in, frame_out, metadata=None):
+        """ Set a shot and its frame range, written on save() """
+        change = (sequence, shot_name, frame_in, frame_out, metadata or {})
+        self.changes.append(change)
+        self._apply(self.shot_info, *change)
+
+    @staticmethod
+    def _apply(data, sequence, shot_name, frame_in, frame_out, metadata):
+        shots = data.setdefault('shots', {}).setdefault(sequence, {})
+        shot = shots.setdefault(shot_name, {})
+        shot.setdefault('metadata', {}).update(metadata)
+        data.setdefault('shotRanges', {}).setdefault(sequence, {})[shot_name] = [frame_in, frame_out]
+
+    def save(self):
+        """ Replay the changes on the latest shotInfo.json and replace it in one rename """
+        if not self.changes:
+            return
+
+        with self.lock():
+            # Another exporter may have written since we loaded it
+            with open(self.shot_info_path, 'r') as file:
+                data = json.load(file)
+            for change in self.changes:
+                self._apply(data, *change)
+
+            handle, temp_path = tempfile.mkstemp(dir=self.shot_info_dir, prefix='.shotInfo.', suffix='.tmp')
+            try:
+                with os.fdopen(handle, 'w') as file:
+                    json.dump(data, file)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(temp_path, self.shot_info_path)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+        self.shot_info = data
+        self.changes = []
+
+    def lock(self):
+        return _LockFile(self.shot_info_path + '.lock', self.LOCK_TIMEOUT, self.STALE_LOCK)
+
+    def thumbnail_path(self, sequence, shot_name):
+        return os.path.join(self.shot_info_dir, sequence + '-' + shot_name + '_preview.jpg')
+
+    # Folders
+
+    def shot_folder(self, sequence, shot_name):
+        """ Path of a shot folder, created if needed, checked against the cached layout """
+        if self.layout is None:
+            self.layout = {}
+            if os.path.isdir(self.shots_folder):
+                for entry in os.scandir(self.shots_folder):
+                    if entry.is_dir():
+                        self.layout[entry.name] = None  # Shots listed on first use
+
+        path = os.path.join(self.shots_folder, sequence, shot_name)
+        shots = self.layout.get(sequence)
+        if shots is None:
+            sequence_folder = os.path.join(self.shots_folder, sequence)
+            shots = set()
+            if sequence in self.layout:
+                shots = {entry.name for entry in os.scandir(sequence_folder) if entry.is_dir()}
+            self.layout[sequence] = shots
+
+        if shot_name not in shots:
+            os.makedirs(path, exist_ok=True)
+            shots.add(shot_name)
+        return path
+
+    def next_version_folder(self, destination_path):
+        """ Next vXXXX folder in destination_path, counted once then tracked in memory """
+        count = self.version_counts.get(destination_path)
+        if count is None:
+            try:
+                count = sum(1 for entry in os.scandir(destination_path) if entry.is_dir())
+            except OSError:
+                count = 0
+        count += 1
+        self.version_counts[destination_path] = count
+        return os.path.join(destination_path, 'v' + '{:04d}'.format(count))
+
+
+class _LockFile:
+    """ Exclusive lock through O_EXCL creation of a file, works on network shares """
+
+    def __init__(self, path, timeout, stale_after):
+        self.path = path
+        self.timeout = timeout
+        self.stale_after = stale_after
+
+    def __enter__(self):
+        deadline = time.time() + self.timeout
+        while True:
+            try:
+                handle = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(handle, str(os.getpid()).encode())
+                os.close(handle)
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > self.stale_after:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    continue
+                if time.time() > deadline:
+                    raise PrismLockTimeout(f'{self.path} is held by another export')
+                time.sleep(0.2)
+
+    def __exit__(self, *args):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -2,11 +2,13 @@ import os, sys
 
 from PySide2.QtWidgets import QApplication, QDialog
 from PySide2.QtUiTools import QUiLoader
-from PySide2.QtCore import Qt
+from PySide2.QtCore import Qt, Signal
 from PySide2 import QtCore
 
 
 class progress_dialog(QDialog):
+        cancelled = Signal()
+
         def __init__(self, parent=None):
             QDialog.__init__(self, parent)
             self.setWindowFlags(Qt.WindowCloseButtonHint | Qt.WindowStaysOnTopHint)
@@ -17,7 +19,10 @@ class progress_dialog(QDialog):
             ui_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ui", 'progress_dialog.ui')
             loader = QUiLoader()
             self.ui = loader.load(ui_file, self)
-            self.setFixedSize(400, 92)
+            self.setFixedSize(400, 124)
+
+            self.ui.cancel_button.clicked.connect(self.cancelled.emit)
+            self.set_cancellable(False)
             
         
         def update(self, int_value):
@@ -26,3 +31,7 @@ class progress_dialog(QDialog):
             
         def setText(self, text):
             self.ui.label.setText(text)
+
+        def set_cancellable(self, cancellable):
+            self.ui.cancel_button.setVisible(cancellable)
+            self.ui.cancel_button.setEnabled(cancellable)
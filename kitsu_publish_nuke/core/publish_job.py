@@ -0,0 +1,62 @@
+import gazu
+
+from PySide2.QtCore import QThread, Signal
+
+from core import preview_upload
+from core.thread_client import clone_client
+
+
+class PublishJob(QThread):
+    """
+    Comments on a task, uploads the preview and sets it as main preview, off the GUI thread.
+
+    The job runs with its own gazu client and can be cancelled while the file uploads.
+    """
+    stage_changed = Signal(str)
+    upload_progress = Signal(object, object)  # Bytes sent, total bytes (can be over 2GB)
+    job_finished = Signal(bool, str)  # Success, message
+
+    def __init__(self, task_id, task_status, comment_text, file_path, parent=None):
+        QThread.__init__(self, parent)
+        self.task_id = task_id
+        self.task_status = task_status
+        self.comment_text = comment_text
+        self.file_path = file_path
+        self.is_cancelled = False
+        self.last_progress = -1
+        self.preview_file = None
+
+    def cancel(self):
+        self.is_cancelled = True
+
+    def run(self):
+        try:
+            client = clone_client()
+
+            self.stage_changed.emit('Adding comment ...')
+            comment = gazu.task.add_comment(self.task_id, self.task_status, self.comment_text, client=client)
+
+            self.stage_changed.emit('Uploading to Kitsu... please wait...')
+            self.preview_file = preview_upload.add_preview(
+                self.task_id,
+                comment,
+                self.file_path,
+                progress_callback=self.on_progress,
+                is_cancelled=lambda: self.is_cancelled,
+                client=client
+            )
+
+            self.stage_changed.emit('Setting preview file into database')
+            gazu.task.set_main_preview(self.preview_file, client=client)  # Set preview as asset thumbnail
+            self.job_finished.emit(True, 'Preview published to Kitsu')
+        except preview_upload.UploadCancelled:
+            self.job_finished.emit(False, 'Upload cancelled, the comment was posted without its preview')
+        except Exception as eee:
+            self.job_finished.emit(False, str(eee))
+
+    def on_progress(self, bytes_sent, total_bytes):
+        # One signal per MB is plenty for the dialog
+        megabytes = bytes_sent // 1048576
+        if megabytes != self.last_progress or bytes_sent == total_bytes:
+            self.last_progress = megabytes
+            self.upload_progress.emit(bytes_sent, total_bytes)
@@ -10,18 +10,19 @@ path = os.path.join(folder_path, "utils")
 sys.path.append(path)
 
 try:
-    import gazu
     import json
 
-    import threading
-
     from PySide2.QtCore import QFile, Qt
-    from PySide2.QtWidgets import QApplication, QMainWindow, QWidget, QFormLayout, QFileDialog
+    from PySide2.QtWidgets import QApplication, QMainWindow, QWidget, QFormLayout, QFileDialog, QSystemTrayIcon
     from PySide2.QtUiTools import QUiLoader
-    from PySide2.QtGui import QStandardItem, QStandardItemModel, QIcon
+    from PySide2.QtGui import QIcon
 
     from core.settings import KitsuConnectSettings
     from core.progress_dialog import progress_dialog
+    from core.kitsu_cache import KitsuCache
+    from core.task_tree_model import TaskTreeModel
+    from core.reference_data import shared_reference_data
+    from core.publish_job import PublishJob
     
     class KitsuConnecPublisher(QMainWindow):
         def __init__(self, parent=None):
@@ -50,28 +51,28 @@ try:
 
             self.file_path = None
             self.render_function = None
+            self.background_render_function = None  # Returns a BackgroundRender, or None
+            self.render_job = None
+            self.cache = None
+            self.reference = None
+            self.publish_job = None
+            self.tray_icon = None
 
             if self.file_path:
                 self.ui.publish_file_path.setText(self.file_path)
 
             if self.settings.connection == True:
-                projects = gazu.project.all_open_projects()
+                # Startup reads from the local cache and only fetches what changed on Kitsu
+                self.cache = KitsuCache()
+                # Projects, task types and statuses are looked up locally from here on
+                self.reference = shared_reference_data(self.cache)
+                self.reference.refresh(force=True)
+                projects = self.reference.projects.values()
                 
                 for project in projects:
                     self.ui.project_box.addItem(project['name'])
 
   
-        def send_to_kitsu(self):
-            status = gazu.task.get_task_status_by_short_name("wfa")
-            task = gazu.task.get_task(self.context)
-            comment = gazu.task.add_comment(task, status, self.ui.publish_note.toPlainText())
-
-            self.preview_file = gazu.task.add_preview(
-                   task,
-                   comment,
-                   self.preview_file_path
-                )
-
         def set_file_path(self, file_path):
             self.file_path = file_path
             self.ui.publish_file_path.setText(self.file_path)
@@ -84,27 +85,90 @@ try:
 
             self.progress_dialog.setText('Rendering preview file ...')
             self.progress_dialog.update(10)
+
+            if self.ui.render_in_background.isChecked() and self.background_render_function:
+                self.render_job = self.background_render_function(split=self.ui.split_render.isChecked())
+                if self.render_job:
+                    # Nuke stays usable, the upload starts from on_render_finished
+                    self.render_job.frame_rendered.connect(self.on_frame_rendered)
+                    self.render_job.render_finished.connect(self.on_render_finished)
+                    self.progress_dialog.cancelled.connect(self.render_job.cancel)
+                    self.progress_dialog.set_cancellable(True)
+                    self.render_job.start()
+                    return
             
             self.preview_file_path = self.render_function()
-
+            self.upload_preview()
+
+        def on_frame_rendered(self, done, total):
+            self.progress_dialog.setText(f'Rendering preview file ... frame {done} / {total}')
+            self.progress_dialog.update(10 + int(40 * done / total))
+
+        def on_render_finished(self, success, result):
+            self.progress_dialog.cancelled.disconnect(self.render_job.cancel)
+            self.progress_dialog.set_cancellable(False)
+            cancelled = self.render_job.is_cancelled
+            self.render_job = None
+
+            if success:
+                self.preview_file_path = result
+                self.upload_preview()
+            elif cancelled:
+                self.progress_dialog.hide()
+            else:
+                # No render license or a script the copy can't load, render in this session instead
+                print(f'Kitsu background render failed, rendering in Nuke instead:\n{result}')
+                self.progress_dialog.setText('Background render failed, rendering preview file in Nuke ...')
+                self.progress_dialog.update(10)
+                self.preview_file_path = self.render_function()
+                self.upload_preview()
+
+        def upload_preview(self):
             self.progress_dialog.update(50)
 
             if self.preview_file_path:
-                
-                thread = threading.Thread(target=self.send_to_kitsu)
-                thread.start()
-                self.progress_dialog.setText('Uploading to Kitsu... please wait...')
-                self.progress_dialog.update(80)
-                thread.join()
+                # Everything from here runs on the job thread, Nuke stays usable during the upload
+                self.publish_job = PublishJob(
+                    self.context,
+                    self.reference.task_status_by_short_name("wfa"),
+                    self.ui.publish_note.toPlainText(),
+                    self.preview_file_path
+                )
+                self.publish_job.stage_changed.connect(self.progress_dialog.setText)
+                self.publish_job.upload_progress.connect(self.on_upload_progress)
+                self.publish_job.job_finished.connect(self.on_publish_finished)
+                self.progress_dialog.cancelled.connect(self.publish_job.cancel)
+                self.progress_dialog.set_cancellable(True)
+                self.publish_job.start()
+            else:
+                print('Invalid file path from the render function. \n\nself.render_function = None or False')
 
-                self.progress_dialog.setText('Setting preview file into database')
-                self.progress_dialog.update(90)
-                gazu.task.set_main_preview(self.preview_file) #  Set preview as asset thumbnail
+        def on_upload_progress(self, bytes_sent, total_bytes):
+            if total_bytes:
+                self.progress_dialog.setText(f'Uploading to Kitsu... {bytes_sent // 1048576} / {total_bytes // 1048576} MB')
+                self.progress_dialog.update(50 + int(40 * bytes_sent / total_bytes))
 
+        def on_publish_finished(self, success, message):
+            self.progress_dialog.cancelled.disconnect(self.publish_job.cancel)
+            self.progress_dialog.set_cancellable(False)
+            self.publish_job = None
+
+            if success:
                 self.progress_dialog.setText('DONE !!!')
                 self.progress_dialog.update(100)
             else:
-                print('Invalid file path from the render function. \n\nself.render_function = None or False')
+                self.progress_dialog.setText(message)
+            self.notify(message, success)
+
+        def notify(self, message, success=True):
+            # The progress dialog may be hidden behind Nuke by now, a tray message is seen anyway
+            if not QSystemTrayIcon.isSystemTrayAvailable():
+                return
+            if self.tray_icon is None:
+                self.tray_icon = QSystemTrayIcon(QApplication.windowIcon(), self)
+            self.tray_icon.show()
+            icon = QSystemTrayIcon.Information if success else QSystemTrayIcon.Warning
+            self.tray_icon.showMessage('Kitsu Connect', message, icon, 5000)
 
         def select_file(self):
             file_dialog = QFileDialog()
@@ -121,25 +185,18 @@ try:
 
         def update_context_from_selection(self):
 
-            project = gazu.project.get_project_by_name(self.ui.project_box.currentText())
+            project = self.reference.project_by_name(self.ui.project_box.currentText())
 
-            index = self.ui.treeView.selectedIndexes()[0]
-            item = self.ui.treeView.model().itemFromIndex(index)
-            
-            parent = item
+            selected = self.ui.treeView.selectedIndexes()[0]
+
+            index = selected
             context_list = []
-            context_list.append({
-                        'name': item.text(),
-                        'id': item.toolTip()
-                    })
-
-            while parent != None:
-                parent = parent.parent()
-                if parent:
-                    context_list.append({
-                        'name': parent.text(),
-                        'id': parent.toolTip()
-                    })
+            while index.isValid():
+                context_list.append({
+                    'name': index.data(Qt.DisplayRole),
+                    'id': index.data(Qt.ToolTipRole)
+                })
+                index = index.parent()
 
             context_list.append({
                 'name' : project['name'],
@@ -151,68 +208,29 @@ try:
 
             self.ui.context_text.setText(context)
 
-            task_type = gazu.task.get_task_type_by_name(item.text())
-            if task_type:
+            if selected.data(TaskTreeModel.KindRole) == 'task':
                 # If its a task, enable the button to publish
                 self.ui.publish_button.setEnabled(True)
-                self.context = item.toolTip()
+                self.context = selected.data(Qt.ToolTipRole)
             else:
                 self.ui.publish_button.setEnabled(False)
          
         def load_tree(self):
-            project = gazu.project.get_project_by_name(self.ui.project_box.currentText())
-            sequences = gazu.shot.all_sequences_for_project(project['id'])
-            model = QStandardItemModel()
+            previous_model = self.ui.treeView.model()
+            if isinstance(previous_model, TaskTreeModel):
+                previous_model.shutdown()
 
             if self.ui.showonlymine.isChecked():
-                tasks = gazu.user.all_tasks_to_do()
-                data = {}
-                for task in tasks:
-                    #nuke.tprint(self.ui.project_box.currentText(), task['project_name'])
-                    if self.ui.project_box.currentText() == task['project_name']:
-                        try:
-                            data[task['sequence_name']]
-                        except:
-                            data[task['sequence_name']] = {}
-                        try:
-                            data[task['sequence_name']][task['entity_name']]
-                        except:
-                            data[task['sequence_name']][task['entity_name']] = []
-                    
-                        data[task['sequence_name']][task['entity_name']].append(task)
-                
-                #nuke.tprint(data)
-                for sequence in  data:
-                    item = QStandardItem(sequence)
-                    model.appendRow(item)
-                    for shot in data[sequence]:
-                        shot_item = QStandardItem(str(shot))
-                        item.appendRow(shot_item)
-                        for task in data[sequence][shot]:
-                            task_item = QStandardItem(str(task['task_type_name']))
-                            task_item.setToolTip(str(task['id']))
-                            shot_item.appendRow(task_item)
+                tasks = [
+                    task for task in self.cache.all_tasks_to_do()
+                    if task['project_name'] == self.ui.project_box.currentText()
+                ]
+                model = TaskTreeModel.from_todo_tasks(tasks)
             else:
-                
-                for seq in sequences:
-                    item = QStandardItem(str(seq['name']))
-                    #item.setIcon(QIcon.fromTheme("folder"))
-
-                    model.appendRow(item)
-
-                    shots = gazu.shot.all_shots_for_sequence(seq)
-                    for shot in shots:
-                        shot_item = QStandardItem(str(shot['name']))
-                        item.appendRow(shot_item)
-                        tasks = gazu.task.all_tasks_for_shot(shot)
-                        for task in tasks:
-                            task_item = QStandardItem(str(task['task_type_name']))
-                            task_item.setToolTip(str(task['id']))
-                            shot_item.appendRow(task_item)
+                # Only the sequences are fetched here, shots and tasks load when a sequence is expanded
+                project = self.reference.project_by_name(self.ui.project_box.currentText())
+                model = TaskTreeModel.for_project(project, self.cache)
 
-            
-
-                
             self.ui.treeView.setModel(model)
     
     print('[ SUCCES !!! ] : Kitsu-connect-publisher')
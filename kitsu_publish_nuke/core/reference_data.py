@@ -0,0 +1,96 @@
+import threading
+import time
+
+import gazu
+
+
+class ReferenceData:
+    """
+    In-process indexes of the open projects, task types and task statuses.
+
+    The lists are loaded once per session and looked up by id, name or short name from
+    dicts. They are reloaded when older than ttl, after KitsuCache.sync has applied the
+    Kitsu events, so a renamed status or a new project shows up without a restart.
+    """
+    TTL = 600  # Seconds
+
+    def __init__(self, cache=None, ttl=TTL):
+        self.cache = cache
+        self.ttl = ttl
+        self.loaded_at = 0
+        self.lock = threading.Lock()
+
+        self.projects = {}
+        self.projects_by_name = {}
+        self.task_types = {}
+        self.task_types_by_name = {}
+        self.task_statuses = {}
+        self.task_statuses_by_name = {}
+        self.task_statuses_by_short_name = {}
+
+    def refresh(self, force=False):
+        """ Reload the lists if they are older than the TTL """
+        with self.lock:
+            if not force and time.time() - self.loaded_at < self.ttl:
+                return
+
+            if self.cache:
+                self.cache.sync()
+                projects = self.cache.all_open_projects()
+                task_types = self.cache.all_task_types()
+                task_statuses = self.cache.all_task_statuses()
+            else:
+                projects = gazu.project.all_open_projects()
+                task_types = gazu.task.all_task_types()
+                task_statuses = gazu.task.all_task_statuses()
+
+            self.projects = {project['id']: project for project in projects}
+            self.projects_by_name = {project['name']: project for project in projects}
+            self.task_types = {task_type['id']: task_type for task_type in task_types}
+            self.task_types_by_name = {task_type['name']: task_type for task_type in task_types}
+            self.task_statuses = {status['id']: status for status in task_statuses}
+            self.task_statuses_by_name = {status['name']: status for status in task_statuses}
+            self.task_statuses_by_short_name = {status['short_name']: status for status in task_statuses}
+            self.loaded_at = time.time()
+
+    def invalidate(self):
+        """ Reload on next lookup, for when an event says the lists changed """
+        self.loaded_at = 0
+
+    def _lookup(self, index_name, key):
+        self.refresh()
+        return getattr(self, index_name).get(key)
+
+    def project(self, project_id):
+        return self._lookup('projects', project_id)
+
+    def project_by_name(self, name):
+        return self._lookup('projects_by_name', name)
+
+    def task_type(self, task_type_id):
+        return self._lookup('task_types', task_type_id)
+
+    def task_type_by_name(self, name):
+        return self._lookup('task_types_by_name', name)
+
+    def task_status(self, task_status_id):
+        return self._lookup('task_statuses', task_status_id)
+
+    def task_status_by_name(self, name):
+        return self._lookup('task_statuses_by_name', name)
+
+    def task_status_by_short_name(self, short_name):
+        return self._lookup('task_statuses_by_short_name', short_name)
+
+
+_shared = None
+
+
+def shared_reference_data(cache=None):
+    """ One registry for the whole Nuke session, shared by every publisher window """
+    global _shared
+    if _shared is None:
+        _shared = ReferenceData(cache)
+    elif _shared.cache is None and cache is not None:
+        _shared.cache = cache
+    return _shared
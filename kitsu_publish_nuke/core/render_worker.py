@@ -0,0 +1,43 @@
+# Runs inside a headless Nuke, started by core/background_render.py:
+#
+#   nuke -t render_worker.py render <script.nk> <write node> <first> <last> [<image sequence>]
+#   nuke -t render_worker.py encode <script.nk> <write node> <first> <last> <image sequence>
+#
+# render renders the Write node, or only retargets it to a 16 bit png sequence when one is given,
+# lossless so the encode only compresses the frames once.
+# encode reads a rendered sequence back and writes it with the Write node's own movie settings.
+# Each rendered frame is printed on its own line so the GUI session can follow the progress.
+import sys
+
+import nuke
+
+
+def report_frame():
+    print('KITSU_FRAME %d' % nuke.frame())
+    sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    mode, script, write_name, first_frame, last_frame = sys.argv[1:6]
+    sequence = sys.argv[6] if len(sys.argv) > 6 else None
+    first_frame, last_frame = int(first_frame), int(last_frame)
+
+    nuke.scriptOpen(script)
+    write = nuke.toNode(write_name)
+
+    if mode == 'render' and sequence:
+        write['file'].setValue(sequence)
+        write['file_type'].setValue('png')
+        write['datatype'].setValue('16 bit')
+
+    elif mode == 'encode':
+        # The frames already went through the colorspace conversion when they were rendered
+        read = nuke.nodes.Read(file=sequence, first=first_frame, last=last_frame)
+        read['raw'].setValue(True)
+        write.setInput(0, read)
+        write['raw'].setValue(True)
+
+    nuke.addAfterFrameRender(report_frame, nodeClass='Write')
+    nuke.execute(write, first_frame, last_frame)
+    print('KITSU_DONE')
+    sys.stdout.flush()
@@ -0,0 +1,144 @@
+import os
+import re
+import threading
+from collections import Counter, namedtuple
+
+
+SEQUENCE_EXTENSIONS = ('exr', 'dpx', 'png', 'jpg', 'jpeg', 'tif', 'tiff')
+
+# Prefix, frame number and extension of a frame file, like shot010_comp.1001.exr
+FRAME_PATTERN = re.compile(r'^(.*?)(\d+)\.([A-Za-z0-9]+)$')
+
+# Compact description of a sequence: first and last frame, frame padding, and the
+# missing frames as (first, last) runs
+FrameRange = namedtuple('FrameRange', ['start', 'end', 'padding', 'missing'])
+
+
+class ImageSequence:
+    """ Frames sharing a prefix and an extension in one directory """
+
+    def __init__(self, directory, prefix, extension):
+        self.directory = directory
+        self.prefix = prefix
+        self.extension = extension
+        self.frames = {}  # Frame number > file path
+        self.duplicates = []  # (frame, file path) of frames already in the sequence with another padding
+        self.paddings = Counter()
+
+    def add(self, frame, digits, path):
+        if frame in self.frames:
+            self.duplicates.append((frame, path))
+            return
+        self.frames[frame] = path
+        self.paddings[len(digits)] += 1
+
+    @property
+    def files(self):
+        """ File paths in frame order """
+        return [self.frames[frame] for frame in sorted(self.frames)]
+
+    @property
+    def padding(self):
+        return self.paddings.most_common(1)[0][0] if self.paddings else 0
+
+    @property
+    def pattern(self):
+        return f'{self.prefix}{"#" * self.padding}.{self.extension}'
+
+    @property
+    def missing(self):
+        """ Gaps between the first and last frame as (first, last) runs """
+        frames = sorted(self.frames)
+        return [(a + 1, b - 1) for a, b in zip(frames, frames[1:]) if b - a > 1]
+
+    @property
+    def frame_range(self):
+        frames = self.frames.keys()
+        return FrameRange(min(frames), max(frames), self.padding, self.missing)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __repr__(self):
+        start, end, padding, missing = self.frame_range
+        return f'<ImageSequence {self.pattern} {start}-{end}, {len(missing)} gaps, {len(self.duplicates)} duplicates>'
+
+
+def _group(entries, extensions):
+    """ Group (directory, filename) pairs into sequences, single frames are kept as one-frame sequences """
+    extensions = {ext.lower() for ext in extensions}
+    sequences = {}
+    for directory, filename in entries:
+        match = FRAME_PATTERN.match(filename)
+        if not match:
+            continue
+        prefix, digits, extension = match.groups()
+        if extension.lower() not in extensions:
+            continue
+        key = (directory, prefix, extension.lower())
+        if key not in sequences:
+            sequences[key] = ImageSequence(directory, prefix, extension)
+        sequences[key].add(int(digits), digits, os.path.join(directory, filename))
+    return sorted(sequences.values(), key=lambda seq: (seq.directory, seq.prefix, seq.extension))
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def scan_directory(directory, extensions=SEQUENCE_EXTENSIONS):
+    """
+    List the image sequences of a directory with a single os.scandir pass.
+
+    Results are memoized per (directory, mtime): adding or removing a file changes the
+    directory mtime, so repeated scans of an unchanged render folder cost one stat.
+
+    Returns:
+        list: ImageSequence objects sorted by prefix.
+    """
+    directory = os.path.abspath(directory)
+    mtime = os.stat(directory).st_mtime_ns
+    key = (directory, tuple(extensions))
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with os.scandir(directory) as entries:
+        names = [(directory, entry.name) for entry in entries if entry.is_file()]
+    sequences = _group(names, extensions)
+
+    with _cache_lock:
+        _cache[key] = (mtime, sequences)
+    return sequences
+
+
+def sequences_from_files(files, extensions=SEQUENCE_EXTENSIONS):
+    """ Group an explicit list of file paths, like dropped files, into sequences without touching the disk """
+    return _group(((os.path.dirname(path), os.path.basename(path)) for path in files), extensions)
+
+
+def sequence_for_file(path, extensions=SEQUENCE_EXTENSIONS):
+    """ Return the sequence a frame file belongs to, or None """
+    match = FRAME_PATTERN.match(os.path.basename(path))
+    if not match:
+        return None
+    prefix, _, extension = match.groups()
+    for sequence in scan_directory(os.path.dirname(path), extensions):
+        if sequence.prefix == prefix and sequence.extension.lower() == extension.lower():
+            return sequence
+    return None
+
+
+def describe_gaps(sequence):
+    """ Readable summary of missing and duplicate frames, empty if the sequence is complete """
+    messages = []
+    missing = sequence.missing
+    if missing:
+        runs = ', '.join(str(a) if a == b else f'{a}-{b}' for a, b in missing)
+        count = sum(b - a + 1 for a, b in missing)
+        messages.append(f'{count} missing frames in {sequence.pattern}: {runs}')
+    if sequence.duplicates:
+        frames = ', '.join(str(frame) for frame, _ in sequence.duplicates)
+        messages.append(f'Duplicate frames in {sequence.pattern}: {frames}')
+    return messages
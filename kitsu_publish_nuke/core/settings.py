@@ -2,7 +2,6 @@
 print('IMPORTING : Kitsu-connect-settings')
 
 try:
-    import gazu
     import json
     import os
 
@@ -11,6 +10,8 @@ try:
     from PySide2.QtUiTools import QUiLoader
     from PySide2.QtGui import QStandardItem, QStandardItemModel, QIcon
 
+    from core import token_store
+
     folder_path = os.path.dirname(os.path.dirname(__file__))
     
     class KitsuConnectSettings(QMainWindow):
@@ -32,8 +33,10 @@ try:
             
         def check_connection(self, dict_data):
             try:
-                gazu.client.set_host(dict_data['Kitsu API adress'])
-                gazu.log_in(dict_data['Username'], dict_data['Password'])
+                # Stored tokens skip the password login, it is only used when they can't be refreshed
+                if token_store.restore_session(dict_data['Kitsu API adress'], dict_data['Username']):
+                    return True
+                token_store.log_in(dict_data['Kitsu API adress'], dict_data['Username'], dict_data['Password'])
                 return True
             except Exception as eee:
                 return str(eee)
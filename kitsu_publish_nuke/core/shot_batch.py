@@ -0,0 +1,115 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import gazu
+
+from core.thread_client import thread_client
+
+
+MAX_WORKERS = 8  # Concurrent writes, enough to hide latency without flooding the Kitsu server
+
+
+def clip_plan_entry(clip):
+    """ Plain values of a timeline clip, read on the GUI thread so workers never touch Hiero objects """
+    return {
+        'name': clip.name(),
+        'source_in': clip.sourceIn(),
+        'source_out': clip.sourceOut(),
+        'fps': clip.source().framerate().toString(),
+    }
+
+
+def build_plan(entries, shots_by_name):
+    """
+    Mark each shot of the clip entries as a shot to create or to update.
+
+    Clips sharing a name are one shot, written once. The last clip sets its range, as
+    an export going clip by clip used to.
+
+    Args:
+        entries (list): Dicts made by clip_plan_entry.
+        shots_by_name (dict): Existing shots of the sequence by name.
+
+    Returns:
+        list: One entry per shot name, each with an 'action' ('create' or 'update'), the
+        existing 'shot' if any and the number of 'duplicates' merged into it.
+    """
+    plan = {}
+    for entry in entries:
+        duplicates = plan[entry['name']]['duplicates'] + 1 if entry['name'] in plan else 0
+        shot = shots_by_name.get(entry['name'])
+        plan[entry['name']] = dict(entry, action='update' if shot else 'create', shot=shot, duplicates=duplicates)
+    return list(plan.values())
+
+
+def plan_summary(plan):
+    creates = len([entry for entry in plan if entry['action'] == 'create'])
+    updates = len([entry for entry in plan if entry['action'] == 'update'])
+    return f'{creates} new shots will be created and {updates} existing shots updated.'
+
+
+def describe_plan(plan):
+    creates = [entry['name'] for entry in plan if entry['action'] == 'create']
+    updates = [entry['name'] for entry in plan if entry['action'] == 'update']
+    duplicates = [f"{entry['name']} ({entry['duplicates'] + 1} clips)" for entry in plan if entry['duplicates']]
+    lines = []
+    if creates:
+        lines.append(f'{len(creates)} new shots: ' + ', '.join(creates))
+    if updates:
+        lines.append(f'{len(updates)} existing shots to update: ' + ', '.join(updates))
+    if duplicates:
+        lines.append('Clips sharing a name are exported as one shot, with the range of the last clip: '
+                     + ', '.join(duplicates))
+    return '\n\n'.join(lines)
+
+
+def plate_data(entry):
+    """ Frame range of the copied plate, when the export copies one """
+    if not entry.get('plate_range'):
+        return {}
+    return {'plate_in': entry['plate_range'][0], 'plate_out': entry['plate_range'][1]}
+
+
+def _apply_entry(project, sequence, entry):
+    client = thread_client()
+    if entry['action'] == 'update':
+        shot = entry['shot']
+        shot['data']['frame_in'] = entry['source_in'] + 1
+        shot['data']['frame_out'] = entry['source_out'] + 1
+        shot['nb_frames'] = entry['source_out'] - entry['source_in']
+        shot['data']['fps'] = entry['fps']
+        shot['data'].update(plate_data(entry))
+        return gazu.shot.update_shot(shot, client=client)
+
+    return gazu.shot.new_shot(
+        project,
+        sequence,
+        entry['name'],
+        frame_in=entry['source_in'] + 1,
+        frame_out=entry['source_out'],
+        nb_frames=entry['source_out'] - entry['source_in'],
+        data=dict({
+            'fps': entry['fps']
+        }, **plate_data(entry)),
+        client=client
+    )
+
+
+def apply_plan(project, sequence, plan, max_workers=MAX_WORKERS):
+    """
+    Run the creates and updates of a plan on a bounded pool, each thread with its own gazu client.
+
+    Yields:
+        tuple: (entry, shot, error) as each write completes, error is None on success.
+    """
+    entries = [entry for entry in plan if entry['action'] in ('create', 'update')]
+    if not entries:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(entries))) as executor:
+        futures = {executor.submit(_apply_entry, project, sequence, entry): entry for entry in entries}
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                yield entry, future.result(), None
+            except Exception as eee:
+                yield entry, None, eee
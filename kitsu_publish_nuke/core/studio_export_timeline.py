@@ -1,15 +1,19 @@
 import gazu
 import nuke, hiero
-import os, sys, json, shutil, tempfile
+import os, sys, tempfile
 
 from core.settings import KitsuConnectSettings
 
 from PySide2.QtCore import QFile, Qt, QCoreApplication
-from PySide2.QtWidgets import QApplication, QMainWindow, QWidget, QFileDialog
+from PySide2.QtWidgets import QApplication, QMainWindow, QWidget, QFileDialog, QMessageBox
 from PySide2.QtUiTools import QUiLoader
 
 from core.settings import KitsuConnectSettings
 from core.progress_dialog import progress_dialog
+from core.sequence_scanner import sequence_for_file, describe_gaps
+from core import shot_batch
+from core.copy_engine import CopyJob
+from core.prism_project import PrismProject, PrismLockTimeout
 
 folder_path = os.path.dirname(os.path.dirname(__file__))
 path = os.path.join(folder_path, "site-packages")
@@ -30,6 +34,7 @@ class export_timeline(QMainWindow):
         self.settings = KitsuConnectSettings()
         self.prism_folder_path = None 
         self.files_to_copy = None
+        self.copy_job = None
 
         if self.settings.connection == True:
             projects = gazu.project.all_open_projects()
@@ -72,184 +77,145 @@ class export_timeline(QMainWindow):
         self.files_to_copy = []
 
         if (selection):
-            for clip in selection: 
-                self.ui.status_text.setText('STATUS : Exporting '+ clip.name())
-                shot = gazu.shot.get_shot_by_name(seq,clip.name())
-
-                thumbnail_file = clip.source().thumbnail()
-
-                if shot:
-                    question = nuke.ask(shot['name'] + ' Already exists, do you want to update it')
-                    #nuke.tprint(shot)
-                    if question:
-                        shot['data']['frame_in']= clip.sourceIn()+1
-                        shot['data']['frame_out']= clip.sourceOut()+1
-                        shot['nb_frames'] = clip.sourceOut()-clip.sourceIn()
-                        shot['data']['fps'] = clip.source().framerate().toString()
-                        gazu.shot.update_shot(shot)
-
-                        # Set the thumbnail for the shot
-                        #gazu.shot.update_shot_thumbnail(shot["id"], thumbnail_bytes)
-                else:
-                    shot = gazu.shot.new_shot(
-                        project, 
-                        seq, 
-                        clip.name(), 
-                        frame_in=clip.sourceIn()+1, 
-                        frame_out=clip.sourceOut(),
-                        nb_frames = clip.sourceOut()-clip.sourceIn(),
-                        data = {
-                            'fps':clip.source().framerate().toString()
-                            }
-                    )
-                    #gazu.shot.update_shot_thumbnail(shot["id"], thumbnail_bytes)
-
-                if self.ui.prism_box.isChecked():
-                    if self.prism_folder_path:
-                        #try:
-                        project_folder = self.prism_folder_path
-                        sequence = seq['name']
-                        shot_name = clip.name()
-                        frame_in = int(clip.sourceIn()+1)
-                        frame_out = int(clip.sourceOut()+1)
-
-                        json_file = os.path.join(project_folder, '00_Pipeline', 'Shotinfo', 'shotInfo.json')
-                        shot_folder = os.path.join(project_folder, '03_Production', 'Shots', sequence)
-
-                        # Load the JSON file into a dictionary
-                        with open(json_file, 'r') as file:
-                            data = json.load(file)
-
-                        # Create shot folder
-                        if not os.path.exists(shot_folder):
-                            os.makedirs(os.path.join(shot_folder))
-                        if not os.path.exists(os.path.join(shot_folder, shot_name)):
-                            os.makedirs(os.path.join(shot_folder, shot_name))
-
-                        # set shot name and info
-                        try:
-                            test_var = data['shots']
-                        except:
-                            data['shots'] = {}
-
-                        if sequence not in data['shots']:
-                            data['shots'][sequence] = {}
-                        data['shots'][sequence][shot_name] = {'metadata': {}}
-
-                        # set Shot range
-                        if sequence not in data['shotRanges']:
-                            data['shotRanges'][sequence] = {}
-                        data['shotRanges'][sequence][shot_name] = [frame_in, frame_out]
-
-                        # Save the modified dictionary back to the JSON file
-                        with open(json_file, 'w') as file:
-                            json.dump(data, file)
-
-                        #set thumbnail
-                        thumbnail_path = os.path.join(project_folder, '00_Pipeline', 'Shotinfo', sequence+'-'+shot_name+'_preview.jpg')
-                        clip.source().thumbnail().save(thumbnail_path, 'JPEG')
-                        #copy the file to prism folders
-                        og_file_path = clip.source().mediaSource().firstpath()
-                        destination_path = os.path.join(shot_folder, shot_name, 'Renders','external','sourceplate')
-                        self.files_to_copy.append([og_file_path, destination_path])
-                        
-            if self.ui.prism_box.isChecked():
-                for file in self.files_to_copy:
-                    og_file_path = file[0]
-                    destination_path = file[1]
-                    try:
-                        folder_count = 0
-                        for dir in os.listdir(destination_path):
-                            if os.path.isdir(os.path.join(destination_path,dir)):
-                                folder_count += 1
-                    except:
-                        pass
-
-                    destination_path_version = os.path.join(destination_path, 'v'+'{:04d}'.format(folder_count+1))
-                    complete_dest_path = os.path.join(destination_path_version, 'rgb')
-
-                    if not os.path.exists(complete_dest_path):
-                        os.makedirs(complete_dest_path)
-
-                    self.ui.status_text.setText('STATUS : Copying '+ os.path.basename(og_file_path))
-                    self.copy_file_with_progress(og_file_path, os.path.join(complete_dest_path, os.path.basename(og_file_path)))
-
-            #except Exception as eee:
-            #    nuke.message(str(eee))
+            # One request for the shots of the sequence, then the whole selection is planned locally
+            shots_by_name = {shot['name']: shot for shot in gazu.shot.all_shots_for_sequence(seq)}
+            copy_to_prism = self.ui.prism_box.isChecked() and self.prism_folder_path
+            handles = self.ui.handles_box.value()
+            entries = []
+            plates = {}  # Clip name > (plate files, copied frame range)
+            for clip in selection:
+                entry = shot_batch.clip_plan_entry(clip)
+                if copy_to_prism:
+                    plates[entry['name']] = self.plate_files(clip, handles)
+                    entry['plate_range'] = plates[entry['name']][1]
+                entries.append(entry)
+            plan = shot_batch.build_plan(entries, shots_by_name)
+            if not self.confirm_plan(plan):
+                return
+
+            errors = []
+            writes = len([entry for entry in plan if entry['action'] != 'skip'])
+            for done, (entry, shot, error) in enumerate(shot_batch.apply_plan(project, seq, plan), 1):
+                if error:
+                    errors.append(f"{entry['name']} : {error}")
+                self.ui.status_text.setText(f'STATUS : Exporting shots {done} / {writes}')
+                QCoreApplication.processEvents()
+            if errors:
+                nuke.message('Some shots could not be sent to Kitsu :\n\n' + '\n'.join(errors))
+
+            if copy_to_prism:
+                # shotInfo.json is loaded once, every clip is applied in memory and it is written once
+                prism = PrismProject(self.prism_folder_path)
+                sequence = seq['name']
+                # Same shot grouping as the plan, the last clip of a name wins
+                clips_by_name = {clip.name(): clip for clip in selection}
+                for shot_name, clip in clips_by_name.items():
+                    plate_files, plate_range = plates[shot_name]
+                    metadata = {}
+                    if plate_range:
+                        metadata = {'plate_range': list(plate_range), 'plate_handles': handles}
+                    prism.set_shot(sequence, shot_name, int(clip.sourceIn()+1), int(clip.sourceOut()+1), metadata)
+
+                    # Create shot folder
+                    shot_folder = prism.shot_folder(sequence, shot_name)
+
+                    #set thumbnail
+                    clip.source().thumbnail().save(prism.thumbnail_path(sequence, shot_name), 'JPEG')
+                    #copy the file to prism folders
+                    destination_path = os.path.join(shot_folder, 'Renders','external','sourceplate')
+                    self.files_to_copy.append([plate_files, destination_path])
+
+                try:
+                    prism.save()
+                except PrismLockTimeout as eee:
+                    nuke.message(str(eee))
+                    return
+
+                copies = []
+                for plate_files, destination_path in self.files_to_copy:
+                    complete_dest_path = os.path.join(prism.next_version_folder(destination_path), 'rgb')
+                    copies.extend((file, os.path.join(complete_dest_path, os.path.basename(file))) for file in plate_files)
+
+                # The copy runs off the GUI thread, the export finishes in on_copy_finished
+                self.ui.export_button.setEnabled(False)
+                self.copy_job = CopyJob(copies)
+                self.copy_job.copy_progress.connect(self.on_copy_progress)
+                self.copy_job.copy_finished.connect(self.on_copy_finished)
+                self.copy_job.start()
+                return
+
             self.ui.status_text.setText('STATUS : Done !!!')
             nuke.message('Exported successfully !!!')
             self.close()
 
-    def scan_for_exr_sequences(self,directory):
-        import glob
-        from collections import defaultdict
-        # Use glob to find all .exr files in the directory
-        exr_files = glob.glob(os.path.join(directory, '*.exr'))
-
-        # Dictionary to hold sequences
-        sequences = defaultdict(list)
-
-        # Regular expression to match sequence files
-        import re
-        sequence_pattern = re.compile(r'(.*?)(\d+)(\.exr)$')
-
-        for file in exr_files:
-            filename = os.path.basename(file)
-            match = sequence_pattern.match(filename)
-            if match:
-                prefix, frame_number, extension = match.groups()
-                sequences[prefix].append((int(frame_number), file))
-
-        # Sort each sequence by frame number
-        for prefix in sequences:
-            sequences[prefix].sort()
-
-        # Convert each list of tuples to a list of filenames
-        for prefix in sequences:
-            sequences[prefix] = [file for frame_number, file in sequences[prefix]]
-
-        return sequences
-
-    def copy_file_with_progress(self, source, destination, chunk_size=4096*4096):
-        # Get the size of the source file
-        #nuke.tprint(source, destination)
-        total_size = os.stat(source).st_size
-        bytes_written = 0
-
-        if str(source).endswith('.exr'):
-            directory = os.path.dirname(source)
-            exr_sequences = self.scan_for_exr_sequences(directory)
-
-            # Print the sequences
-            for prefix, files in exr_sequences.items():
-                print(f"Sequence {prefix}:")
-                files_lenght = len(files)
-                for file_num, file in enumerate(files):
-                    percentage = file_num/files_lenght*100
-                    print(percentage)
-                    status = f"Copying {os.path.basename(file)}... {percentage:.2f}%"
-                    self.ui.status_text.setText(f'STATUS : {status}')
-                    QCoreApplication.processEvents()
-                    nuke.tprint(status, end='\r')
-                    shutil.copyfile(file, os.path.join(os.path.dirname(destination),os.path.basename(file)))
-
-                    
-
-        else:
-            with open(source, 'rb') as fsrc, open(destination, 'wb') as fdst:
-                while True:
-                    # Read a chunk from the source file
-                    chunk = fsrc.read(chunk_size)
-                    if not chunk:
-                        break
-
-                    # Write the chunk to the destination file
-                    fdst.write(chunk)
-                    bytes_written += len(chunk)
-
-                    # Calculate and print the progress
-                    percentage = (bytes_written / total_size) * 100
-                    status = f"Copying {os.path.basename(source)}... {percentage:.2f}%"
-                    self.ui.status_text.setText(f'STATUS : {status}')
-                    QCoreApplication.processEvents()
-                    nuke.tprint(status, end='\r')
+    def on_copy_progress(self, done, total, bytes_done, bytes_per_second):
+        status = f'Copying plates {done} / {total} ({bytes_done / 1048576:.0f} MB at {bytes_per_second / 1048576:.1f} MB/s)'
+        self.ui.status_text.setText(f'STATUS : {status}')
+
+    def on_copy_finished(self, success, message):
+        nuke.tprint(message)
+        self.ui.export_button.setEnabled(True)
+        if not success:
+            self.ui.status_text.setText('STATUS : Copy failed')
+            nuke.message(message)
+            return
+        self.ui.status_text.setText('STATUS : Done !!!')
+        nuke.message('Exported successfully !!!\n\n' + message)
+        self.close()
+
+    def closeEvent(self, event):
+        if self.copy_job and self.copy_job.isRunning():
+            self.copy_job.cancel()
+            self.copy_job.wait()
+        QMainWindow.closeEvent(self, event)
+
+    def confirm_plan(self, plan):
+        """ Ask once for the whole selection, existing shots can be skipped """
+        message_box = QMessageBox(self)
+        message_box.setWindowTitle('Kitsu Connect - Export Timeline')
+        message_box.setText(shot_batch.plan_summary(plan))
+        message_box.setDetailedText(shot_batch.describe_plan(plan))
+        apply_button = message_box.addButton('Export', QMessageBox.AcceptRole)
+        create_only_button = None
+        if any(entry['action'] == 'update' for entry in plan):
+            apply_button.setText('Create and update')
+            create_only_button = message_box.addButton('Create new shots only', QMessageBox.AcceptRole)
+        message_box.addButton(QMessageBox.Cancel)
+        message_box.exec_()
+
+        clicked = message_box.clickedButton()
+        if clicked == create_only_button:
+            for entry in plan:
+                if entry['action'] == 'update':
+                    entry['action'] = 'skip'
+            return True
+        return clicked == apply_button
+
+    def plate_files(self, clip, handles=0):
+        """
+        Files of the plate used by a clip.
+
+        For an EXR sequence only the frames of the cut plus the handles are kept, other
+        sequences sharing the folder are ignored.
+
+        Returns:
+            tuple: ([file path, ...], (first, last) copied frames or None for a movie).
+        """
+        media_source = clip.source().mediaSource()
+        source = media_source.firstpath()
+        sequence = None
+        if str(source).lower().endswith('.exr'):
+            sequence = sequence_for_file(source, ('exr',))
+        if sequence is None:
+            return [source], None
+
+        for message in describe_gaps(sequence):
+            nuke.tprint(message)
+
+        # Clip source frames are counted from the first frame of the media
+        start_frame = int(media_source.startTime())
+        sequence_range = sequence.frame_range
+        first = max(start_frame + int(clip.sourceIn()) - handles, sequence_range.start)
+        last = min(start_frame + int(clip.sourceOut()) + handles, sequence_range.end)
+        files = [sequence.frames[frame] for frame in range(first, last + 1) if frame in sequence.frames]
+        return files, (first, last)
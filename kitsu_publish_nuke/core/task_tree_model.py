@@ -0,0 +1,225 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import gazu
+
+from PySide2.QtCore import Qt, QAbstractItemModel, QModelIndex, Signal
+
+from core.tree_loader import load_sequence_shots, sort_by_name
+from core.thread_client import thread_client
+
+
+class TaskTreeNode:
+    """ Sequence, shot or task of the publisher tree """
+
+    def __init__(self, kind, data, children=None):
+        self.kind = kind
+        self.data = data
+        self.parent = None
+        self.children = []
+        # Sequences fetch their shots on expand, shots and tasks are built complete
+        self.loaded = kind != 'sequence'
+        self.loading = False
+        if children is not None:
+            self.set_children(children)
+
+    def set_children(self, children):
+        for child in children:
+            child.parent = self
+        self.children = children
+        self.loaded = True
+
+    @property
+    def name(self):
+        if self.kind == 'task':
+            return str(self.data.get('task_type_name'))
+        return str(self.data.get('name'))
+
+    def row(self):
+        return self.parent.children.index(self) if self.parent else 0
+
+
+def shot_node(shot, tasks):
+    return TaskTreeNode('shot', shot, [TaskTreeNode('task', task) for task in tasks])
+
+
+class TaskTreeModel(QAbstractItemModel):
+    """
+    Sequence > Shot > Task model that loads the shots of a sequence only when it is expanded.
+
+    The shots are fetched on a thread pool, the expanded sequence shows a placeholder
+    row until they arrive. Expanding a sequence also prefetches the next sequences, so
+    they open instantly if the artist keeps going down the list.
+    """
+    KindRole = Qt.UserRole + 1  # 'sequence', 'shot', 'task' or 'placeholder'
+    PREFETCH_SIBLINGS = 2
+
+    shots_loaded = Signal(object, object)  # Sequence node, future of load_sequence_shots
+
+    def __init__(self, nodes, task_type_names=None, parent=None):
+        QAbstractItemModel.__init__(self, parent)
+        self.root = TaskTreeNode('root', {}, nodes)
+        self.task_type_names = task_type_names or {}
+        self.executor = ThreadPoolExecutor(max_workers=self.PREFETCH_SIBLINGS)
+        self.prefetches = {}  # Sequence id > future of load_sequence_shots
+        self.lock = threading.Lock()
+        self.closed = False
+        # Queued across threads, rows are only ever inserted on the GUI thread
+        self.shots_loaded.connect(self._insert_shots)
+
+    @classmethod
+    def for_project(cls, project, cache=None):
+        """ Model of a whole project, only the sequences are fetched up front """
+        task_types = cache.all_task_types() if cache else gazu.task.all_task_types()
+        sequences = gazu.shot.all_sequences_for_project(project)
+        return cls(
+            [TaskTreeNode('sequence', sequence) for sequence in sort_by_name(sequences)],
+            {task_type['id']: task_type['name'] for task_type in task_types}
+        )
+
+    @classmethod
+    def from_todo_tasks(cls, tasks):
+        """ Complete model built from to-do list tasks, which already hold their sequence and shot names """
+        sequences = {}
+        for task in tasks:
+            sequence = sequences.setdefault(task['sequence_name'], ({
+                'id': task.get('sequence_id') or '',
+                'name': task['sequence_name'],
+            }, {}))
+            shot = sequence[1].setdefault(task['entity_name'], ({
+                'id': task['entity_id'],
+                'name': task['entity_name'],
+            }, []))
+            shot[1].append(task)
+
+        nodes = [
+            TaskTreeNode('sequence', sequence, [shot_node(shot, shot_tasks) for shot, shot_tasks in shots.values()])
+            for sequence, shots in sequences.values()
+        ]
+        return cls(nodes)
+
+    def shutdown(self):
+        self.closed = True
+        self.executor.shutdown(wait=False)
+
+    # Lazy loading
+
+    def _load_sequence(self, sequence):
+        # Runs on the pool, the GUI thread keeps the default client to itself
+        return load_sequence_shots(sequence, self.task_type_names, client=thread_client())
+
+    def _prefetch(self, node):
+        with self.lock:
+            if node.loaded or node.data['id'] in self.prefetches:
+                return
+            self.prefetches[node.data['id']] = self.executor.submit(self._load_sequence, node.data)
+
+    def canFetchMore(self, parent):
+        node = self.node_from_index(parent)
+        return not node.loaded and not node.loading
+
+    def fetchMore(self, parent):
+        """ Start loading the shots of a sequence, never blocks the GUI thread """
+        node = self.node_from_index(parent)
+        if node.loaded or node.loading:
+            return
+
+        node.loading = True
+        self.beginInsertRows(parent, 0, 0)
+        node.children = [TaskTreeNode('placeholder', {'name': 'Loading...'})]
+        node.children[0].parent = node
+        self.endInsertRows()
+
+        with self.lock:
+            future = self.prefetches.pop(node.data['id'], None)
+            if future is None:
+                future = self.executor.submit(self._load_sequence, node.data)
+        future.add_done_callback(lambda done: self._emit_loaded(node, done))
+
+        # The next sequences are the likeliest to be opened next
+        siblings = node.parent.children
+        for sibling in siblings[node.row() + 1:node.row() + 1 + self.PREFETCH_SIBLINGS]:
+            self._prefetch(sibling)
+
+    def _emit_loaded(self, node, future):
+        if self.closed:
+            return
+        try:
+            self.shots_loaded.emit(node, future)
+        except RuntimeError:
+            pass  # The model was deleted while the shots were loading
+
+    def _insert_shots(self, node, future):
+        if self.closed:
+            return
+        try:
+            shots = future.result()
+        except Exception as eee:
+            print(f'Cannot load the shots of {node.name} : {eee}')
+            shots = None
+
+        parent = self.createIndex(node.row(), 0, node)
+        self.beginRemoveRows(parent, 0, len(node.children) - 1)
+        node.children = []
+        self.endRemoveRows()
+        node.loading = False
+
+        if shots is None:
+            node.loaded = False  # Expanding it again retries
+            return
+
+        children = [shot_node(shot, tasks) for shot, tasks in shots]
+        if children:
+            self.beginInsertRows(parent, 0, len(children) - 1)
+            node.set_children(children)
+            self.endInsertRows()
+        else:
+            node.set_children([])
+
+    # QAbstractItemModel
+
+    def node_from_index(self, index):
+        return index.internalPointer() if index.isValid() else self.root
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self.node_from_index(parent)
+        if column != 0 or not 0 <= row < len(node.children):
+            return QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is None or parent is self.root:
+            return QModelIndex()
+        return self.createIndex(parent.row(), 0, parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self.node_from_index(parent).children)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self.node_from_index(parent)
+        return not node.loaded or bool(node.children)
+
+    def flags(self, index):
+        if index.isValid() and index.internalPointer().kind == 'placeholder':
+            return Qt.NoItemFlags
+        return QAbstractItemModel.flags(self, index)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.DisplayRole:
+            return node.name
+        if role == Qt.ToolTipRole:
+            return str(node.data['id']) if 'id' in node.data else None
+        if role == self.KindRole:
+            return node.kind
+        return None
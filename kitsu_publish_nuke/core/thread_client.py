@@ -0,0 +1,33 @@
+import threading
+
+import gazu
+
+
+def clone_client(client=None):
+    """
+    New gazu client logged in with the same host, tokens and connection settings as client.
+
+    A gazu client wraps one requests session, which is not safe to share between
+    threads, so each background job gets its own. SSL verification, the client
+    certificate and the token refresh behaviour are copied so a studio server with
+    its own certificate authority works the same from every thread.
+    """
+    client = client or gazu.client.default_client
+    new_client = gazu.client.create_client(client.host, ssl_verify=client.session.verify)
+    # Set after creation, older gazu versions take no refresh options and drop the cert
+    new_client.session.cert = client.session.cert
+    for attribute in ('event_host', 'automatic_refresh_token', 'callback_not_authenticated'):
+        if hasattr(client, attribute):
+            setattr(new_client, attribute, getattr(client, attribute))
+    gazu.client.set_tokens(dict(client.tokens), client=new_client)
+    return new_client
+
+
+_local = threading.local()
+
+
+def thread_client(client=None):
+    """ gazu client of the calling thread, cloned from client the first time the thread asks """
+    if getattr(_local, 'client', None) is None:
+        _local.client = clone_client(client)
+    return _local.client
@@ -0,0 +1,25 @@
+import gazu
+
+
+def load_sequence_shots(sequence, task_type_names, client=gazu.client.default_client):
+    """ Shots of one sequence with their tasks, in two requests, as [(shot, [task, ...]), ...] """
+    shots = gazu.shot.all_shots_for_sequence(sequence, client=client)
+    tasks = gazu.task.all_tasks_for_sequence(sequence, client=client)
+    tasks_by_shot = group_shot_tasks(shots, tasks, task_type_names)
+    return [(shot, tasks_by_shot[shot['id']]) for shot in sort_by_name(shots)]
+
+
+def group_shot_tasks(shots, tasks, task_type_names):
+    """ Group tasks by shot id, sorted by task type name, adding the task_type_name key """
+    tasks_by_shot = {shot['id']: [] for shot in shots}
+    for task in tasks:
+        task['task_type_name'] = task_type_names.get(task['task_type_id'], task.get('task_type_name'))
+        if task['entity_id'] in tasks_by_shot:
+            tasks_by_shot[task['entity_id']].append(task)
+    for shot_tasks in tasks_by_shot.values():
+        shot_tasks.sort(key=lambda task: str(task['task_type_name']))
+    return tasks_by_shot
+
+
+def sort_by_name(entities):
+    return sorted(entities, key=lambda entity: entity['name'])
@@ -16,42 +16,50 @@ try:
     from nukescripts import panels
 
     from core import publisher
+    from core import background_render
 
     #panels.registerWidgetAsPanel('KitsuConnect', 'Kitsu Connect 1.0', 'uk.co.thefoundry.KitsuConnect')
 
-    def kitsu_render_preview():
-
-        if nuke.selectedNodes():
+    def create_preview_write_node(node):
 
-            node = nuke.selectedNodes()[0]
-            write_node = nuke.createNode('Write')
+        write_node = nuke.createNode('Write')
 
-            # Set the file path and settings for the Write node (modify these according to your requirements)
+        # Set the file path and settings for the Write node (modify these according to your requirements)
 
-            # first we doa temp file
-            temp_dir = tempfile.mkdtemp()
-            output_file_path = os.path.join(temp_dir, 'kitsu_preview.mov')
-            output_file_path = output_file_path.replace(os.sep, '/')
+        # first we doa temp file
+        temp_dir = tempfile.mkdtemp()
+        output_file_path = os.path.join(temp_dir, 'kitsu_preview.mov')
+        output_file_path = output_file_path.replace(os.sep, '/')
 
-            # we set all the settings
+        # we set all the settings
 
-            write_node['file'].setValue(output_file_path)
-            #write_node['file_type'].setValue('mov')
-            write_node['mov64_codec'].setValue(11)
-            write_node['mov_prores_codec_profile'].setValue(4)
-            write_node['create_directories'].setValue(True)
+        write_node['file'].setValue(output_file_path)
+        #write_node['file_type'].setValue('mov')
+        write_node['mov64_codec'].setValue(11)
+        write_node['mov_prores_codec_profile'].setValue(4)
+        write_node['create_directories'].setValue(True)
+        
+        if nuke.root()['OCIO_config'].value() != 'nuke-default':
+            if nuke.root()['colorManagement'].value() == 'OCIO':
+                write_node['colorspace'].setValue('matte_paint')
             
-            if nuke.root()['OCIO_config'].value() != 'nuke-default':
-                if nuke.root()['colorManagement'].value() == 'OCIO':
-                    write_node['colorspace'].setValue('matte_paint')
-                
 
-            # connect and place the nodes
+        # connect and place the nodes
+
+        write_node.setInput(0, node)
+      
+        write_node.setXpos(node.xpos())
+        write_node.setYpos(node.ypos() + 80)
+
+        return write_node, output_file_path
 
-            write_node.setInput(0, node)
-          
-            write_node.setXpos(node.xpos())
-            write_node.setYpos(node.ypos() + 80)
+    def kitsu_render_preview():
+        output_file_path = None
+
+        if nuke.selectedNodes():
+
+            node = nuke.selectedNodes()[0]
+            write_node, output_file_path = create_preview_write_node(node)
             
             first_frame = nuke.Root()['first_frame'].value()
             last_frame = nuke.Root()['last_frame'].value()
@@ -60,6 +68,25 @@ try:
 
         return output_file_path
 
+    def kitsu_background_render(split=False):
+        # Same render as kitsu_render_preview, but in a headless Nuke so the session stays usable.
+        # With split, chunks of the range are rendered in parallel processes then encoded.
+        if not nuke.selectedNodes():
+            return None
+
+        node = nuke.selectedNodes()[0]
+        write_node, output_file_path = create_preview_write_node(node)
+
+        first_frame = nuke.Root()['first_frame'].value()
+        last_frame = nuke.Root()['last_frame'].value()
+        try:
+            render_class = background_render.SplitRender if split else background_render.BackgroundRender
+            render = render_class(write_node, first_frame, last_frame, output_file_path)
+        finally:
+            # The saved copy holds the Write node, the session does not need it anymore
+            nuke.delete(write_node)
+        return render
+
     def nuke_kitsu_publisher():
         if nuke.selectedNodes():
             if 'Read' in nuke.selectedNodes()[0].Class():
@@ -69,6 +96,7 @@ try:
                 nuke_publisher.set_file_path(str(node['file'].getValue()))
                 
                 nuke_publisher.render_function = kitsu_render_preview
+                nuke_publisher.background_render_function = kitsu_background_render
                 nuke_publisher.show()
 
     def export_timeline():
@@ -0,0 +1,60 @@
+"""
+Compare single-process and segmented encoding of a synthetic image sequence.
+
+    python benchmark_encode.py --ffmpeg ./ffmpeg --frames 3000 --size 1920x1080
+"""
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import segment_encode
+
+
+def make_sequence(ffmpeg, folder, frames, size, fps):
+    pattern = os.path.join(folder, 'frame.%05d.png')
+    subprocess.check_call([
+        ffmpeg, '-y', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate={fps}',
+        '-frames:v', str(frames), pattern
+    ])
+    return sorted(glob.glob(os.path.join(folder, 'frame.*.png')))
+
+
+def timed(label, func):
+    start = time.time()
+    code = func()
+    elapsed = time.time() - start
+    print(f'{label:<30} {elapsed:8.1f}s  (exit code {code})')
+    return elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ffmpeg', default='ffmpeg')
+    parser.add_argument('--frames', type=int, default=3000)
+    parser.add_argument('--size', default='1920x1080')
+    parser.add_argument('--fps', type=float, default=24)
+    parser.add_argument('--segments', type=int, default=segment_encode.default_segment_count())
+    parser.add_argument('--preset', default=segment_encode.DEFAULT_PRESET, choices=segment_encode.PRESETS.keys())
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix='kitsu_benchmark_')
+    try:
+        print(f'Writing {args.frames} frames of {args.size}...')
+        files = make_sequence(args.ffmpeg, folder, args.frames, args.size, args.fps)
+        output = os.path.join(folder, 'out.mp4')
+
+        single = timed('Single process', lambda: segment_encode.encode_part(
+            args.ffmpeg, files, args.fps, output, args.preset
+        ))
+        segments = len(segment_encode.split_ranges(len(files), args.segments))
+        segmented = timed(f'{segments} parallel segments', lambda: segment_encode.encode_segmented(
+            args.ffmpeg, files, args.fps, output, args.preset, args.segments
+        )[0])
+        print(f'Speedup: {single / segmented:.2f}x')
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
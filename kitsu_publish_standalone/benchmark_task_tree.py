@@ -0,0 +1,109 @@
+"""
+Time building the task tree widget from synthetic rows, with the path index and with
+the widget scan it replaced.
+
+    python benchmark_task_tree.py --tasks 20000 --projects 4
+
+No Kitsu server is needed, the rows are made up with the keys load_tree_snapshot returns.
+"""
+import argparse
+import sys
+import time
+
+from PyQt5 import QtWidgets
+from PyQt5.QtCore import Qt
+
+from kitsu_publisher_standalone import kitsu_publisher_standalone_gui
+
+
+TASKS_PER_ELEMENT = 5
+ELEMENTS_PER_SEQUENCE = 20
+
+
+def make_rows(task_count, project_count):
+    rows = []
+    for index in range(task_count):
+        element = index // TASKS_PER_ELEMENT
+        rows.append({
+            'project': f'Project {element % project_count}',
+            'type': 'Shot',
+            'seq': f'SQ{element // ELEMENTS_PER_SEQUENCE:03d}',
+            'element': f'SH{element:05d}',
+            'task': f'Task {index % TASKS_PER_ELEMENT}',
+            'context_id': f'task-{index}',
+            'preview_id': f'preview-{element}',
+        })
+    return rows
+
+
+class NoThumbnails:
+    def request(self, preview_id):
+        pass
+
+
+class TreeBench:
+    """ The attributes add_task_row uses, without the rest of the publisher window """
+    get_tree_node = kitsu_publisher_standalone_gui.get_tree_node
+    add_task_row = kitsu_publisher_standalone_gui.add_task_row
+
+    def __init__(self):
+        self.tree_widget = QtWidgets.QTreeWidget()
+        self.tree_index = {}
+        self.task_items = {}
+        self.thumbnail_items = {}
+        self.thumbnails = NoThumbnails()
+
+
+def find_or_create_child(parent_item, child_name):
+    for i in range(parent_item.childCount()):
+        child = parent_item.child(i)
+        if child.text(0) == child_name:
+            return child
+    new_child = QtWidgets.QTreeWidgetItem([child_name])
+    parent_item.addChild(new_child)
+    return new_child
+
+
+def scan_build(tree_widget, rows):
+    """ The lookup the tree used before the path index: findItems and linear child scans """
+    root_items = {}
+    for item_data in rows:
+        project_name = item_data['project']
+        if project_name not in root_items:
+            tree_widget.addTopLevelItem(QtWidgets.QTreeWidgetItem([project_name]))
+            root_items[project_name] = {}
+        project_item = tree_widget.findItems(project_name, Qt.MatchExactly | Qt.MatchRecursive)[0]
+        if item_data['type'] not in root_items[project_name]:
+            type_item = QtWidgets.QTreeWidgetItem([item_data['type']])
+            project_item.addChild(type_item)
+            root_items[project_name][item_data['type']] = type_item
+        type_item = root_items[project_name][item_data['type']]
+        seq_item = find_or_create_child(type_item, item_data['seq'])
+        element_item = find_or_create_child(seq_item, item_data['element'])
+        task_item = QtWidgets.QTreeWidgetItem([item_data['task']])
+        task_item.setData(1, 0, item_data['context_id'])
+        element_item.addChild(task_item)
+
+
+def timed(label, func):
+    start = time.time()
+    func()
+    elapsed = time.time() - start
+    print(f'{label:<30} {elapsed:8.2f}s')
+    return elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=20000)
+    parser.add_argument('--projects', type=int, default=4)
+    args = parser.parse_args()
+
+    app = QtWidgets.QApplication(sys.argv)
+    rows = make_rows(args.tasks, args.projects)
+    print(f'Building a tree of {len(rows)} tasks...')
+
+    bench = TreeBench()
+    indexed = timed('Path index', lambda: [bench.add_task_row(row) for row in rows])
+    scanned = timed('Widget scan', lambda: scan_build(QtWidgets.QTreeWidget(), rows))
+    print(f'Speedup: {scanned / max(indexed, 0.001):.2f}x')
@@ -0,0 +1,120 @@
+"""
+Time the task tree snapshot against a local Kitsu stub, at several task counts.
+
+    python benchmark_tree_snapshot.py --tasks 100 1000 10000 --projects 4 --latency 0.02
+
+A local http.server answers the /data routes used by load_tree_snapshot with synthetic
+projects, task types, entities and tasks. --latency adds a delay to each request to
+stand in for a remote server, so the request count shows in the timings.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import gazu
+
+from tree_snapshot import load_tree_snapshot
+
+
+TASKS_PER_SHOT = 5
+SHOTS_PER_SEQUENCE = 20
+
+
+def make_project(project_index, task_count):
+    """ Entities and tasks of one synthetic project, shots grouped under sequences """
+    project_id = f'project-{project_index}'
+    shot_count = max(task_count // TASKS_PER_SHOT, 1)
+    sequences = [
+        {'id': f'{project_id}-sequence-{index}', 'name': f'SQ{index:03d}', 'entity_type_id': 'sequence-type',
+         'parent_id': None, 'preview_file_id': None}
+        for index in range(max(shot_count // SHOTS_PER_SEQUENCE, 1))
+    ]
+    shots = [
+        {'id': f'{project_id}-shot-{index}', 'name': f'SH{index:04d}', 'entity_type_id': 'shot-type',
+         'parent_id': sequences[index % len(sequences)]['id'], 'preview_file_id': None}
+        for index in range(shot_count)
+    ]
+    tasks = [
+        {'id': f'{project_id}-task-{index}', 'project_id': project_id, 'entity_id': shots[index % shot_count]['id'],
+         'task_type_id': f'task-type-{index % TASKS_PER_SHOT}'}
+        for index in range(task_count)
+    ]
+    return {'id': project_id, 'name': f'Project {project_index}'}, sequences + shots, tasks
+
+
+class StubKitsu(BaseHTTPRequestHandler):
+    latency = 0
+    projects = []
+    entities = {}  # Project id > entities
+    tasks = {}  # Project id > tasks
+    requests = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            self.requests.append(self.path)
+        url = urlparse(self.path)
+        route = url.path.split('/api/data/', 1)[-1]
+        project_id = parse_qs(url.query).get('project_id', [None])[0]
+
+        if route == 'projects/open':
+            body = self.projects
+        elif route == 'task-types':
+            body = [
+                {'id': f'task-type-{index}', 'name': f'Task type {index}', 'for_entity': 'Shot'}
+                for index in range(TASKS_PER_SHOT)
+            ]
+        elif route == 'entity-types':
+            body = [{'id': 'sequence-type', 'name': 'Sequence'}, {'id': 'shot-type', 'name': 'Shot'}]
+        elif route == 'tasks':
+            body = self.tasks.get(project_id, [])
+        elif route == 'entities':
+            body = self.entities.get(project_id, [])
+        else:
+            self.send_error(404)
+            return
+
+        time.sleep(self.latency)
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--projects', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds added to each request')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubKitsu)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    gazu.client.set_host(f'http://127.0.0.1:{server.server_address[1]}/api')
+    gazu.client.set_tokens({'access_token': 'benchmark'})
+    StubKitsu.latency = args.latency
+
+    try:
+        for task_count in args.tasks:
+            StubKitsu.projects = []
+            for index in range(args.projects):
+                project, entities, tasks = make_project(index, task_count // args.projects)
+                StubKitsu.projects.append(project)
+                StubKitsu.entities[project['id']] = entities
+                StubKitsu.tasks[project['id']] = tasks
+
+            del StubKitsu.requests[:]
+            start = time.time()
+            rows = load_tree_snapshot()
+            elapsed = time.time() - start
+            print(f'{task_count:>7} tasks  {len(rows):>7} rows  {len(StubKitsu.requests):>4} requests  {elapsed:7.2f}s')
+    finally:
+        server.shutdown()
@@ -3,10 +3,14 @@ import subprocess
 import os, getpass
 import tempfile
 import json
+import re
+import time
+from collections import deque
 
 import requests
 import zipfile
 import shutil
+import threading
 
 from PyQt5 import QtWidgets, QtCore, QtGui, uic, QtSvg
 from PyQt5.QtGui import QDoubleValidator
@@ -16,6 +20,16 @@ from PyQt5.QtWidgets import QMessageBox
 
 import gazu
 
+from tree_snapshot import load_tree_snapshot
+from thumbnail_service import ThumbnailService
+from task_events import TaskEventListener
+from kitsu_cache import KitsuCache
+import token_store
+import preview_upload
+import segment_encode
+from segment_encode import to_number
+from sequence_scanner import sequences_from_files, describe_gaps
+
 
 _VERSION = "1.0.6"
 parent_folder = os.path.dirname(__file__)
@@ -170,18 +184,28 @@ class Worker(QObject):
         self.finished.emit()  # Emit the finished signal when done
 
 class FFmpegWorker(QtCore.QThread):
-    progress = QtCore.pyqtSignal(int)
+    progress = QtCore.pyqtSignal(int, dict)  # Percent, and frame, total_frames, fps, speed and eta (seconds, -1 if unknown)
     finished = QtCore.pyqtSignal()
     log_update = QtCore.pyqtSignal(str)  # Signal to update the log
 
-    def __init__(self, input_files, output_file, fps):
+    def __init__(self, input_files, output_file, fps, fragmented=False, preset=segment_encode.DEFAULT_PRESET,
+                 segmented=False):
         super().__init__()
         self.input_files = input_files
         self.output_file = output_file
         self.fps = fps
+        self.fragmented = fragmented  # Write a fragmented mp4 that can be read while it grows
+        self.preset = preset
+        self.segmented = segmented  # Encode long image sequences as parallel segments
+        self.returncode = None
+        self.total_frames = 0
+        self.stderr_tail = deque(maxlen=20)  # Last ffmpeg messages, reported if the encode fails
 
     def run(self):
         print(self.input_files)
+        start_time = time.time()
+        # Moov atom first and self-contained fragments, so the file is written front to back
+        output_args = ["-movflags", "frag_keyframe+empty_moov"] if self.fragmented else []
         try:
             # Set the creation flags to avoid a popup window on Windows
             creationflags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
@@ -189,31 +213,29 @@ class FFmpegWorker(QtCore.QThread):
             if len(self.input_files) == 1:
                 # Single file conversion
                 self.log_update.emit("Retrieving file...")
+                # The frame count is read from the input header that ffmpeg prints on stderr
                 cmd = [
                     ffmpeg_exec,
-                    "-y", "-i", self.input_files[0], "-c:v", "libx264",
-                    "-crf", "23", "-preset", "medium", "-c:a", "aac", "-b:a", "128k", self.output_file
+                    "-progress", "pipe:1", "-nostats",
+                    "-y", "-i", self.input_files[0], *segment_encode.PRESETS[self.preset],
+                    "-c:a", "aac", "-b:a", "128k", *output_args, self.output_file
                 ]
                 
+            elif self.segmented and len(segment_encode.split_ranges(len(self.input_files), 2)) > 1:
+                self.run_segmented(output_args)
+                return
+
             else:
                 # Image sequence conversion
                 self.log_update.emit("Retrieving image sequence files...")
-                with open("temp_file_list.txt", "w") as f:
-                    for file in self.input_files:
-                        f.write(f"file '{file}'\n")
-                
-                cmd = [
-                    ffmpeg_dir,
-                    "-apply_trc","bt709",
-                    "-y", "-f", "concat", "-safe", "0", "-r", str(self.fps),
-                    "-i", "temp_file_list.txt",
-                    "-c:v", "libx264",
-                    "-pix_fmt", "yuv420p",
-                    "-r", str(self.fps),  # Linear to BT.709 with gamma correction
-                    "-loglevel", "info",
-                    self.output_file
-                ]
+                segment_encode.write_concat_list("temp_file_list.txt", self.input_files)
 
+                self.total_frames = len(self.input_files)
+                # Linear to BT.709 with gamma correction
+                cmd = segment_encode.sequence_cmd(
+                    ffmpeg_dir, "temp_file_list.txt", self.fps, self.output_file, self.preset,
+                    extra_output_args=output_args
+                )
 
             # Use subprocess.Popen to capture output in real-time and avoid window popup
             process = subprocess.Popen(
@@ -221,28 +243,177 @@ class FFmpegWorker(QtCore.QThread):
                 creationflags=creationflags
             )
 
-            # Monitor the output for progress updates
-            while True:
-                line = process.stderr.readline()  # Read the stderr line by line
-                if line == '' and process.poll() is not None:
-                    break  # Exit if no more output and the process has finished
-                if "frame=" in line:
-                    # Extract frame information and emit progress signal
-                    frame_data = line.split("frame=")[1].split()[0]
-                    if frame_data.isdigit():
-                        self.progress.emit(int(frame_data))  # Emit progress signal with frame count
+            # stderr is drained on its own thread, ffmpeg blocks if either pipe fills up
+            stderr_reader = threading.Thread(target=self.read_stderr, args=(process.stderr,), daemon=True)
+            stderr_reader.start()
 
-                # Optionally, emit other updates based on different ffmpeg output logs
-                #if line:
-                #    self.log_update.emit(line.strip())  # Emit log updates for other messages
+            for stats in segment_encode.read_progress(process.stdout):
+                self.emit_progress(stats)
 
             process.wait()  # Ensure the process completes before moving on
+            stderr_reader.join()
+            self.returncode = process.returncode
+            if self.returncode != 0:
+                self.log_update.emit('<br>'.join(self.stderr_tail))
         finally:
+            if self.returncode == 0:
+                self.log_update.emit(f'Encoded in {time.time() - start_time:.1f}s')
             if os.path.exists("temp_file_list.txt"):
                 os.remove("temp_file_list.txt")
 
             self.finished.emit()  # Emit finished signal when done
 
+    def run_segmented(self, output_args):
+        segments = len(segment_encode.split_ranges(len(self.input_files), segment_encode.default_segment_count()))
+        self.log_update.emit(f"Encoding image sequence in {segments} parallel segments...")
+        self.total_frames = len(self.input_files)
+
+        def on_progress(frame, fps, speed):
+            self.emit_progress({'frame': frame, 'fps': fps, 'speed': f'{speed:.2f}x', 'progress': 'continue'})
+
+        self.returncode, errors = segment_encode.encode_segmented(
+            ffmpeg_dir, self.input_files, self.fps, self.output_file, self.preset, segments,
+            extra_output_args=output_args, progress_callback=on_progress
+        )
+        if self.returncode == 0:
+            self.emit_progress({'frame': self.total_frames, 'progress': 'end'})
+        else:
+            self.log_update.emit(errors.replace('\n', '<br>'))
+
+    def read_stderr(self, stream):
+        duration = None
+        input_fps = None
+        for line in stream:
+            line = line.strip()
+            if line:
+                self.stderr_tail.append(line)
+            if self.total_frames:
+                continue
+
+            # Only the first Duration and video stream lines describe the input
+            if duration is None:
+                match = re.search(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)', line)
+                if match:
+                    hours, minutes, seconds = match.groups()
+                    duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+            if input_fps is None and 'Video:' in line:
+                match = re.search(r'([\d.]+) fps', line)
+                if match:
+                    input_fps = float(match.group(1))
+            if duration and input_fps:
+                self.total_frames = int(round(duration * input_fps))
+
+    def emit_progress(self, stats):
+        frame = to_number(stats.get('frame'), int)
+        fps = to_number(stats.get('fps'), float)
+        total = self.total_frames
+
+        if stats.get('progress') == 'end':
+            percent = 100
+        elif total:
+            percent = min(int(frame * 100 / total), 99)
+        else:
+            percent = 0
+        eta = int((total - frame) / fps) if total and fps > 0 else -1
+
+        self.progress.emit(percent, {
+            'frame': frame,
+            'total_frames': total,
+            'fps': fps,
+            'speed': stats.get('speed', 'N/A').strip(),
+            'eta': max(eta, -1),
+        })
+
+class UploadWorker(QtCore.QThread):
+    progress = QtCore.pyqtSignal(int)  # Upload percentage
+    upload_finished = QtCore.pyqtSignal(bool, str)
+    log_update = QtCore.pyqtSignal(str)  # Signal to update the log
+
+    def __init__(self, task_id, status_name, comment_text, file_path, pipelined=False):
+        super().__init__()
+        self.task_id = task_id
+        self.status_name = status_name
+        self.comment_text = comment_text
+        self.file_path = file_path
+        self.percent = -1
+
+        # When pipelined, the upload starts while ffmpeg is still writing file_path
+        self.pipelined = pipelined
+        self.encoding_done = threading.Event()
+        self.encoding_ok = True
+
+    def finish_encoding(self, success):
+        """ Called once ffmpeg exits, lets the streamed upload send its last bytes """
+        self.encoding_ok = success
+        self.encoding_done.set()
+
+    def run(self):
+        try:
+            status = gazu.task.get_task_status_by_name(self.status_name)
+            task = gazu.task.get_task(self.task_id)
+            comment = gazu.task.add_comment(task, status, self.comment_text)
+
+            if self.pipelined:
+                self.upload_while_encoding(task, comment)
+            else:
+                self.log_update.emit('Uploading preview file...')
+                preview_upload.add_preview(task, comment, self.file_path, progress_callback=self.on_progress)
+
+            # Remove the temporary preview file
+            if os.path.exists(self.file_path):
+                os.remove(self.file_path)
+            self.upload_finished.emit(True, '')
+        except Exception as eee:
+            self.upload_finished.emit(False, str(eee))
+
+    def upload_while_encoding(self, task, comment):
+        preview_file = gazu.task.create_preview(task, comment)
+        self.log_update.emit('Uploading preview file while encoding...')
+        try:
+            preview_upload.upload_growing_file(
+                preview_file,
+                self.file_path,
+                self.encoding_done,
+                is_valid=lambda: self.encoding_ok,
+                progress_callback=self.on_progress
+            )
+            return
+        except Exception as eee:
+            if self.encoding_done.is_set() and not self.encoding_ok:
+                self.discard(comment, preview_file)
+                raise Exception('The preview file could not be encoded')
+            # The server may refuse chunked uploads, send the finished file the usual way instead
+            self.log_update.emit(f'Streamed upload failed ({eee}), uploading once encoding is done...')
+
+        self.encoding_done.wait()
+        if not self.encoding_ok:
+            self.discard(comment, preview_file)
+            raise Exception('The preview file could not be encoded')
+        preview_upload.upload_preview_file(preview_file, self.file_path, progress_callback=self.on_progress)
+
+    def discard(self, comment, preview_file):
+        """ Remove the comment posted ahead of a failed encode, Kitsu then puts the task status back """
+        try:
+            gazu.files.remove_preview_file(preview_file)
+            gazu.task.remove_comment(comment)
+            self.log_update.emit('Encoding failed, the comment and its preview were removed from Kitsu')
+        except Exception as eee:
+            self.log_update.emit(
+                f'<span style="color:red;">Encoding failed and the comment could not be removed ({eee}), '
+                'please delete it on Kitsu</span>'
+            )
+
+    def on_progress(self, bytes_sent, total_bytes):
+        if not total_bytes and self.pipelined:
+            # The file is still growing, measure against what ffmpeg has written so far
+            total_bytes = max(os.path.getsize(self.file_path), bytes_sent, 1)
+            if not self.encoding_done.is_set():
+                total_bytes += 1  # Never 100% before the encode ends
+        percent = int(bytes_sent * 100 / total_bytes) if total_bytes else 100
+        if percent != self.percent:
+            self.percent = percent
+            self.progress.emit(percent)
+
 class DropZoneLabel(QtWidgets.QLabel):
     fileSelected = QtCore.pyqtSignal(list)  # Signal to emit selected files
 
@@ -312,6 +483,11 @@ class kitsu_settings(QtWidgets.QWidget):
             self.check_connection()
                 
     def check_connection(self):
+        # Stored refresh token first, it outlives the access token kept in the settings
+        if token_store.restore_session(self.url+'/api', self.user):
+            self.access_token = gazu.client.default_client.tokens['access_token']
+            self.parent.connection_status = True
+            return True
         if self.access_token:
             try:
                 token = {'access_token': self.access_token}
@@ -331,9 +507,8 @@ class kitsu_settings(QtWidgets.QWidget):
         try:
             self.user = self.t_user.text()
             self.url = self.t_url.text()
-            gazu.client.set_host(self.url+'/api')
-            gazu.log_in(self.user, self.t_pwd.text())
-            self.access_token = gazu.refresh_token()['access_token']
+            tokens = token_store.log_in(self.url+'/api', self.user, self.t_pwd.text())
+            self.access_token = tokens['access_token']
             return self.access_token
         except Exception as eee:
             self.setConnectStatus(False)
@@ -438,8 +613,19 @@ class kitsu_publisher_standalone_gui(QtWidgets.QMainWindow):
         # Connect signals and slots
         self.thread.started.connect(self.worker.run)          # Start the worker's run method when the thread starts
         self.worker.finished.connect(self.thread.quit)        # Quit the thread when the worker finishes
+        self.thread.finished.connect(self.start_live_updates)  # Listen for task changes once the tree is built
 
         self.context = None
+
+        # Thumbnails are fetched in the background and filled in as they arrive
+        self.thumbnails = ThumbnailService(os.path.join(config_dir, 'thumbnails'))
+        self.thumbnails.thumbnail_ready.connect(self.set_element_thumbnail)
+        self.thumbnail_items = {}
+        self.tree_index = {}
+        self.task_items = {}
+        self.event_listener = None
+        self.cache = None
+
         self.ks = kitsu_settings(self)
         self.is_scanning = True
 
@@ -478,6 +664,10 @@ class kitsu_publisher_standalone_gui(QtWidgets.QMainWindow):
         
         self.show_only_my_tasks.stateChanged.connect(self.build_tasks_tree)
 
+        self.encode_preset.addItems(segment_encode.PRESETS.keys())
+        self.encode_preset.setCurrentText(segment_encode.DEFAULT_PRESET)
+        self.live_updates.stateChanged.connect(self.start_live_updates)
+
         self.file_manager = DropZoneLabel('test', self)
         self.file_manager.setText(self.file_drop.text())  # Keep the existing text
         self.file_manager.setGeometry(self.file_drop.geometry())
@@ -492,6 +682,11 @@ class kitsu_publisher_standalone_gui(QtWidgets.QMainWindow):
         self.ks.check_connection()
 
 
+    def closeEvent(self, event):
+        self.stop_live_updates()
+        self.thumbnails.shutdown()
+        super().closeEvent(event)
+
     def check_for_updates(self):
         self.update_log('Checking for updates...')
         try:
@@ -647,14 +842,26 @@ class kitsu_publisher_standalone_gui(QtWidgets.QMainWindow):
             
 
     def set_files(self, files):
-        self.input_files = sorted(files)
         self.update_log('Selected '+str(len(files))+' files')
+        sequences = sequences_from_files(files) if len(files) > 1 else []
+        if sequences:
+            # Frame order rather than name order, so unpadded frame numbers stay in sequence
+            frames = [file for sequence in sequences for file in sequence.files]
+            grouped = set(frames) | {path for sequence in sequences for _, path in sequence.duplicates}
+            self.input_files = frames + sorted(file for file in files if file not in grouped)
+            if len(sequences) > 1:
+                self.update_log(f'{len(sequences)} different sequences were selected', 'orange')
+            for sequence in sequences:
+                for message in describe_gaps(sequence):
+                    self.update_log(message, 'orange')
+        else:
+            self.input_files = sorted(files)
         if len(files)>1:
-            self.file_list_text = f'{str(len(files))} files\n\n{os.path.basename(files[0])}\n[...]\n{os.path.basename(files[-1])}'
+            self.file_list_text = f'{str(len(files))} files\n\n{os.path.basename(self.input_files[0])}\n[...]\n{os.path.basename(self.input_files[-1])}'
         else:
             self.file_list_text = f'{os.path.basename(files[0])}'
 
-        self.t_worker = T_Extractor(files[0])
+        self.t_worker = T_Extractor(self.input_files[0])
         self.t_worker.log_update.connect(self.update_log)          # Start the worker's run method when the thread starts
         self.t_worker.finished.connect(self.set_thumbnail) 
         self.t_worker.start()
@@ -741,17 +948,97 @@ class kitsu_publisher_standalone_gui(QtWidgets.QMainWindow):
         #self.file_manager.setPixmap(thumbnail)
         
         
-    def find_or_create_child(self, parent_item, child_name, thumbnail=None):
-        """ Helper function to find a child with the given name or create a new one """
-        for i in range(parent_item.childCount()):
-            child = parent_item.child(i)
-            if child.text(0) == child_name:
-                return child
-
-        # If the child does not exist, create and add it
-        new_child = QtWidgets.QTreeWidgetItem([child_name])
-        parent_item.addChild(new_child)
-        return new_child
+    def get_tree_node(self, path):
+        """ Return the tree item for a (project, type, seq, element) path, creating the missing levels """
+        node = self.tree_index.get(path)
+        if node is None:
+            node = QtWidgets.QTreeWidgetItem([str(path[-1])])
+            if len(path) == 1:
+                self.tree_widget.addTopLevelItem(node)
+            else:
+                self.get_tree_node(path[:-1]).addChild(node)
+            self.tree_index[path] = node
+        return node
+
+    def add_task_row(self, item_data):
+        """ Add a task row to the tree: Project > Type > Sequence > Element > Task """
+        element_path = (
+            item_data.get('project') or 'Unknown Project',
+            item_data['type'],
+            item_data['seq'],
+            item_data['element'],
+        )
+        element_item = self.get_tree_node(element_path)
+
+        # Many tasks share the same element preview, only request it once per element
+        preview_id = item_data['preview_id']
+        if preview_id:
+            element_items = self.thumbnail_items.setdefault(preview_id, [])
+            if element_item not in element_items:
+                element_items.append(element_item)
+                self.thumbnails.request(preview_id)
+
+        # Create the Task level item and store the context_id in it for easy retrieval
+        task_item = QtWidgets.QTreeWidgetItem([item_data['task']])
+        task_item.setData(1, 0, item_data['context_id'])
+        element_item.addChild(task_item)
+        self.task_items[item_data['context_id']] = task_item
+        return task_item
+
+    def remove_task_item(self, context_id):
+        """ Remove a task item from the tree, pruning the levels left empty """
+        task_item = self.task_items.pop(context_id, None)
+        if task_item is None:
+            return
+        node = task_item
+        while node is not None and node.childCount() == 0:
+            parent = node.parent()
+            if parent is None:
+                self.tree_widget.takeTopLevelItem(self.tree_widget.indexOfTopLevelItem(node))
+            else:
+                parent.removeChild(node)
+            for path, indexed_node in list(self.tree_index.items()):
+                if indexed_node is node:
+                    del self.tree_index[path]
+                    for items in self.thumbnail_items.values():
+                        if node in items:
+                            items.remove(node)
+            node = parent
+
+    def start_live_updates(self):
+        self.stop_live_updates()
+        if not self.live_updates.isChecked() or not self.connection_status:
+            return
+        if self.thread.isRunning():
+            # The tree is being rebuilt, the listener starts once it is done
+            return
+        self.event_listener = TaskEventListener(only_my_tasks=self.show_only_my_tasks.isChecked())
+        self.event_listener.task_row_changed.connect(self.on_task_row_changed)
+        self.event_listener.task_removed.connect(self.on_task_removed)
+        self.event_listener.log_update.connect(self.update_log)
+        self.event_listener.start()
+
+    def stop_live_updates(self):
+        if self.event_listener is not None:
+            self.event_listener.stop()
+            self.event_listener = None
+
+    def on_task_row_changed(self, item_data):
+        if self.thread.isRunning():
+            return
+        context_id = item_data['context_id']
+        is_new_task = context_id not in self.task_items
+        self.remove_task_item(context_id)
+        self.add_task_row(item_data)
+        if is_new_task:
+            self.update_log(f"New task: {item_data['element']} / {item_data['task']}")
+
+    def on_task_removed(self, context_id):
+        if self.thread.isRunning():
+            return
+        self.remove_task_item(context_id)
+        if self.context == context_id:
+            self.set_context()
 
     def on_item_double_clicked(self, item, column):
         # Print the stored context_id if it's a leaf item (Task level)
@@ -786,11 +1073,23 @@ class kitsu_publisher_standalone_gui(QtWidgets.QMainWindow):
             self.thread.quit()  # Stop the thread's event loop
             self.thread.wait()  # Wait until the thread has finished
 
+        self.stop_live_updates()
         self.is_scanning = True
         self.thread.start()
 
 
+    def set_element_thumbnail(self, preview_id, file_path):
+        image = QtGui.QImage(file_path)
+        if image.isNull():
+            return
+        image = image.scaled(64,27,Qt.AspectRatioMode.KeepAspectRatioByExpanding)
+        for element_item in self.thumbnail_items.get(preview_id, []):
+            element_item.setData(0,1, image)
+
     def refresh_tree(self):
+        self.thumbnail_items = {}
+        self.tree_index = {}
+        self.task_items = {}
         self.tree_widget.clear()
         self.t_task_stat.clear()
         self.image_label.setVisible(True)
@@ -802,111 +1101,42 @@ class kitsu_publisher_standalone_gui(QtWidgets.QMainWindow):
             self.update_log('User interupted task loading !', 'red')
             return False
 
-        for stat in reversed(gazu.task.all_task_statuses()):
+        # Read everything from the local cache, only fetching what changed since the last launch
+        if self.cache is None or self.cache.host != gazu.client.get_host():
+            self.cache = KitsuCache()
+        self.cache.sync()
+
+        for stat in reversed(self.cache.all_task_statuses()):
             self.t_task_stat.addItem(stat['name'])
             self.t_task_stat.setCurrentIndex(0)
 
 
         if self.connection_status:
-            if self.show_only_my_tasks.isChecked():
-                tasks = gazu.user.all_tasks_to_do()
-            else:
-                projects = gazu.project.all_open_projects()  # Retrieves all open projects
-                # Step 3: Get all tasks for each project
-                tasks = []  # Initialize a list to store all tasks
+            self.update_log('Gathering Kitsu informations...')
+            data = load_tree_snapshot(
+                only_my_tasks=self.show_only_my_tasks.isChecked(),
+                is_running=lambda: self.is_scanning,
+                cache=self.cache
+            )
+            if data is None:
+                self.update_log('User interupted task loading !', 'red')
+                self.image_label.setVisible(False)
+                return False
 
-                for project in projects:
-                    # Retrieve tasks for the current project
-                    g_tasks = gazu.task.all_tasks_for_project(project)
-                    tasks.extend(g_tasks)  # Add tasks to the all_tasks list
+            self.update_log('Found '+str(len(data))+' tasks.')
 
-            
-            self.update_log('Found '+str(len(tasks))+' tasks.\nGathering Kitsu informations...')
-            if len(tasks)>40:
-                self.update_log("This may take a while...",'orange')
-
-            data = []
-            for task in tasks:
-                if not self.is_scanning:
-                    self.update_log('User interupted task loading !', 'red')
-                    self.image_label.setVisible(False)
-                    return False
-                task = gazu.task.get_task(task)
-                try:
-                    seq = task['sequence']['name']
-                except:
-                    seq = task['entity_type']['name']
-                
-                if seq is None:
-                    seq = task['entity_type_name']
-                dd = {
-                    'project': task['project']['name'],
-                    'type': task['task_type']['for_entity'],
-                    'seq': seq,
-                    'element': task['entity']['name'],
-                    'task': task['task_type']['name'],
-                    'context_id': task['id'],
-                    'preview_id': task['entity']['preview_file_id'],
-                }
-                data.append(dd)
-
-            root_items = {}
             self.update_log('Building Tree View...')
-            for item_data in data:
-                if not self.is_scanning:
-                    self.update_log('User interupted task loading !', 'red')
-                    self.image_label.setVisible(False)
-                    return False
-                # Create hierarchy: Project > Type > Sequence > Element > Task
-                project_name = item_data.get('project', 'Unknown Project')  # Add a project key
-                type_name = item_data['type']
-                seq_name = item_data['seq']
-                element_name = item_data['element']
-                task_name = item_data['task']
-                context_id = item_data['context_id']
-                preview_id = item_data['preview_id']
-
-                # Create or get the Project level item
-                if project_name not in root_items:
-                    project_item = QtWidgets.QTreeWidgetItem([project_name])
-                    self.tree_widget.addTopLevelItem(project_item)
-                    root_items[project_name] = {}
-                
-                project_item = self.tree_widget.findItems(project_name, Qt.MatchExactly | Qt.MatchRecursive)[0]
-
-                # Create or get the Type level item
-                if type_name not in root_items[project_name]:
-                    type_item = QtWidgets.QTreeWidgetItem([type_name])
-                    project_item.addChild(type_item)
-                    root_items[project_name][type_name] = type_item
-                else:
-                    type_item = root_items[project_name][type_name]
-
-                # Create or get the Sequence level item
-                seq_item = self.find_or_create_child(type_item, seq_name)
-
-                # Create or get the Element level item
-                element_item = self.find_or_create_child(seq_item, element_name)
-                
-                temp_file = tempfile.NamedTemporaryFile(delete=False, prefix=element_name,suffix='.png')  # Keep the file after closing
-                image = None
-                try:
-                    gazu.files.download_preview_file_thumbnail(preview_id, temp_file.name)  # Use temp_file.name              
-                    image = QtGui.QImage(temp_file.name)  # Use temp_file.name to read the image
-                except:
-                    pass
-
-                if image:
-                    element_item.setData(0,1, image.scaled(64,27,Qt.AspectRatioMode.KeepAspectRatioByExpanding))
-                temp_file.close()
-                os.remove(temp_file.name)
-                # Create the Task level item
-                task_item = QtWidgets.QTreeWidgetItem([task_name])
-                # Store the context_id in the task item for easy retrieval
-                task_item.setData(1, 0, context_id)
-
-                # Add Task item under the Element level
-                element_item.addChild(task_item)
+            # Repainting after every insert is what makes big trees crawl, so hold updates until the end
+            self.tree_widget.setUpdatesEnabled(False)
+            try:
+                for item_data in data:
+                    if not self.is_scanning:
+                        self.update_log('User interupted task loading !', 'red')
+                        self.image_label.setVisible(False)
+                        return False
+                    self.add_task_row(item_data)
+            finally:
+                self.tree_widget.setUpdatesEnabled(True)
 
             self.update_log('Task Tree Refreshed !', 'green')
             self.update_log('')
@@ -929,28 +1159,42 @@ class kitsu_publisher_standalone_gui(QtWidgets.QMainWindow):
     def launch_publisher(self):
         self.convert()
 
-    def publish_file_to_kitsu(self):
-
-        try:
-            status = gazu.task.get_task_status_by_name(self.t_task_stat.currentText())
-            task = gazu.task.get_task(self.context)
-            file_string = '\n\n<hr><b><u>FILE :</b></u><i>\n' + str(self.output_file) + '</i>\n'
-            comment = gazu.task.add_comment(task, status, self.t_comment.toPlainText()+file_string)
-
-            preview_file = gazu.task.add_preview(
-                    task,
-                    comment,
-                    self.output_file
-                )
+    def publish_file_to_kitsu(self, pipelined=False):
+        file_string = '\n\n<hr><b><u>FILE :</b></u><i>\n' + str(self.output_file) + '</i>\n'
+        self.uploader = UploadWorker(
+            self.context,
+            self.t_task_stat.currentText(),
+            self.t_comment.toPlainText()+file_string,
+            self.output_file,
+            pipelined=pipelined
+        )
+        self.uploader.progress.connect(self.update_upload_progress)
+        self.uploader.log_update.connect(self.update_log)
+        self.uploader.upload_finished.connect(self.on_upload_finished)
+        self.uploader.start()
+
+    def update_upload_progress(self, percent):
+        self.upload_percent = percent
+        self.show_progress()
+
+    def show_progress(self):
+        if self.pipelined:
+            # Both run at once, the publish is only as far along as the slower one
+            percent = min(self.encode_percent, self.upload_percent)
+            self.progress_bar.setValue(max(self.progress_bar.value(), percent))
+        elif self.upload_percent >= 0:
+            # Encoding fills the first half of the bar, the upload the second half
+            self.progress_bar.setValue(50 + self.upload_percent // 2)
+        else:
+            self.progress_bar.setValue(self.encode_percent // 2)
 
-            # Remove the temporary playblast file
-            if os.path.exists(self.output_file):
-                os.remove(self.output_file)
-            return True
-        except Exception as eee:
-            self.update_log(f'<span style="color:red;">Cannot Publish File:\n\n</span>{str(eee)}')
-            return False
-        self.progress_bar.setValue(80)
+    def on_upload_finished(self, success, message):
+        if success:
+            self.progress_bar.setValue(100)
+            self.update_log('Uploaded Preview File !!!', 'green')
+        else:
+            self.update_log(f'<span style="color:red;">Cannot Publish File:\n\n</span>{message}')
+        self.publish_button.setEnabled(True)  # Re-enable the Convert button
 
     def convert(self):
         temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4")
@@ -971,26 +1215,58 @@ class kitsu_publisher_standalone_gui(QtWidgets.QMainWindow):
 
         self.progress_bar.setValue(0)  # Reset progress bar
         self.progress_bar.setMaximum(100)  # Set maximum for progress bar
+        self.last_logged_percent = -10
+        self.encode_percent = 0
+        self.upload_percent = -1  # Not started
 
         self.publish_button.setEnabled(False)  # Disable the Convert button
-        self.worker = FFmpegWorker(self.input_files, self.output_file, fps)
+        self.pipelined = self.upload_while_encoding.isChecked()
+        self.worker = FFmpegWorker(
+            self.input_files,
+            self.output_file,
+            fps,
+            fragmented=self.pipelined,
+            preset=self.encode_preset.currentText(),
+            segmented=self.parallel_encode.isChecked()
+        )
         self.worker.progress.connect(self.update_progress)
         self.worker.finished.connect(self.on_finished)
         self.worker.log_update.connect(self.update_log)  # Connect log update signal
         self.worker.start()  # Start the thread
 
-    def update_progress(self, frame):
-        # Update the progress bar based on the number of frames processed
-        self.progress_bar.setValue(frame)
-        if frame > 0 :
-            self.update_log('Exporting frame: ' + str(frame))
+        if self.pipelined:
+            # Comment, preview record and upload run while ffmpeg encodes
+            self.publish_file_to_kitsu(pipelined=True)
+
+    def update_progress(self, percent, stats):
+        self.encode_percent = percent
+        self.show_progress()
+
+        eta = stats['eta']
+        eta_text = f'{eta // 60}:{eta % 60:02d}' if eta >= 0 else '--:--'
+        total = stats['total_frames'] or '?'
+        status = f"Encoding {percent}% - frame {stats['frame']}/{total} - {stats['fps']:.1f} fps - {stats['speed']} - ETA {eta_text}"
+        self.progress_bar.setToolTip(status)
+
+        # Log every 10% so the log stays readable on long sequences
+        if percent // 10 != self.last_logged_percent // 10:
+            self.last_logged_percent = percent
+            self.update_log(status)
 
     def on_finished(self):
-        self.update_log(f'Uploaded Preview File !!!')
+        success = self.worker.returncode == 0
+        if success:
+            self.update_log('Conversion done')
         #QtWidgets.QMessageBox.information(self, "Success", "Conversion completed successfully!")
-        self.progress_bar.setValue(100)  # Set progress bar to complete
-        self.publish_button.setEnabled(True)  # Re-enable the Convert button
-        self.publish_file_to_kitsu()
+        self.encode_percent = 100
+        self.show_progress()
+        if self.pipelined:
+            self.uploader.finish_encoding(success)
+        elif success:
+            self.publish_file_to_kitsu()
+        else:
+            self.update_log('<span style="color:red;">Conversion failed</span>')
+            self.publish_button.setEnabled(True)
 
 
 if __name__ == "__main__":
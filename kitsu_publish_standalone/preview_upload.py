@@ -0,0 +1,229 @@
+import os
+import time
+import uuid
+
+import requests
+
+import gazu
+from gazu.exception import NotAuthenticatedException, UploadFailedException
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadCancelled(Exception):
+    """ Raised from inside the request body when the upload is cancelled """
+
+
+class MultipartFileEncoder:
+    """
+    File-like multipart/form-data body that streams a file in fixed-size chunks.
+
+    requests sends it with a Content-Length and pulls it through read(), so memory
+    use stays at one chunk whatever the file size.
+    """
+
+    def __init__(self, file_path, field_name='file', chunk_size=CHUNK_SIZE, progress_callback=None,
+                 is_cancelled=None):
+        self.chunk_size = chunk_size
+        self.progress_callback = progress_callback
+        self.is_cancelled = is_cancelled
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+
+        filename = os.path.basename(file_path)
+        self.head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'
+        ).encode('utf-8')
+        self.tail = f'\r\n--{self.boundary}--\r\n'.encode('utf-8')
+
+        self.file_size = os.path.getsize(file_path)
+        self.len = len(self.head) + self.file_size + len(self.tail)
+        self.file = open(file_path, 'rb')
+        self.bytes_read = 0
+
+    def __len__(self):
+        return self.len
+
+    def read(self, size=-1):
+        if self.is_cancelled is not None and self.is_cancelled():
+            raise UploadCancelled()
+
+        # Always hand out whole chunks, the socket layer sends whatever we return
+        if self.bytes_read < len(self.head):
+            data = self.head[self.bytes_read:]
+        elif self.bytes_read < len(self.head) + self.file_size:
+            data = self.file.read(self.chunk_size)
+        else:
+            data = self.tail[self.bytes_read - len(self.head) - self.file_size:]
+
+        self.bytes_read += len(data)
+        if self.progress_callback and data:
+            sent = min(max(self.bytes_read - len(self.head), 0), self.file_size)
+            self.progress_callback(sent, self.file_size)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+class GrowingFileEncoder:
+    """
+    Multipart body streamed from a file that is still being written, like an encoder output.
+
+    The body length is unknown until the writer is done, so requests sends it with chunked
+    transfer encoding. Reading stops once is_complete is set and the file is drained.
+    """
+
+    def __init__(self, file_path, is_complete, is_valid=None, field_name='file', chunk_size=CHUNK_SIZE,
+                 progress_callback=None, poll_interval=0.2):
+        self.file_path = file_path
+        self.is_complete = is_complete
+        self.is_valid = is_valid
+        self.chunk_size = chunk_size
+        self.progress_callback = progress_callback
+        self.poll_interval = poll_interval
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+
+        filename = os.path.basename(file_path)
+        self.head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'
+        ).encode('utf-8')
+        self.tail = f'\r\n--{self.boundary}--\r\n'.encode('utf-8')
+
+    def __iter__(self):
+        yield self.head
+
+        bytes_sent = 0
+        with open(self.file_path, 'rb') as f:
+            while True:
+                # Check completion before reading so the last bytes written are never skipped
+                complete = self.is_complete.is_set()
+                data = f.read(self.chunk_size)
+                if data:
+                    bytes_sent += len(data)
+                    if self.progress_callback:
+                        self.progress_callback(bytes_sent, 0)
+                    yield data
+                elif complete:
+                    break
+                else:
+                    self.is_complete.wait(self.poll_interval)
+
+        if self.is_valid is not None and not self.is_valid():
+            raise UploadFailedException('The file being streamed was not written completely')
+        yield self.tail
+
+
+def upload_preview_file(preview_file, file_path, progress_callback=None, normalize_movie=True,
+                        chunk_size=CHUNK_SIZE, retries=5, is_cancelled=None, client=None):
+    """
+    Stream a file to a preview file record, retrying transient failures with backoff.
+
+    Kitsu has no resumable upload, so a retry streams the file again from the start,
+    but into the same preview record.
+
+    Args:
+        preview_file (dict): The preview file created with gazu.task.create_preview.
+        file_path (str): The file to upload.
+        progress_callback (callable, optional): Called with (bytes_sent, total_bytes).
+        normalize_movie (bool): Let Kitsu normalize the movie.
+        retries (int): Number of retries after a connection error or server error.
+        is_cancelled (callable, optional): Returns True to abort the upload with UploadCancelled.
+
+    Returns:
+        dict: The uploaded preview file.
+    """
+    client = client or gazu.client.default_client
+    path = 'pictures/preview-files/%s' % preview_file['id']
+    if not normalize_movie:
+        path += '?normalize=false'
+    url = gazu.client.get_full_url(path, client=client)
+
+    attempt = 0
+    while True:
+        encoder = MultipartFileEncoder(
+            file_path, chunk_size=chunk_size, progress_callback=progress_callback, is_cancelled=is_cancelled
+        )
+        headers = gazu.client.make_auth_header(client=client)
+        headers['Content-Type'] = encoder.content_type
+        try:
+            response = client.session.post(url, data=encoder, headers=headers)
+            if response.status_code < 500:
+                break
+            error = f'server error {response.status_code}'
+        except (requests.ConnectionError, requests.Timeout) as eee:
+            error = str(eee)
+        finally:
+            encoder.close()
+
+        attempt += 1
+        if attempt > retries:
+            raise UploadFailedException(f'Upload failed after {retries} retries: {error}')
+        delay = min(2 ** attempt, 30)
+        print(f'Upload interrupted ({error}), retrying in {delay}s...')
+        time.sleep(delay)
+
+    return read_upload_response(response, path)
+
+
+def upload_growing_file(preview_file, file_path, is_complete, is_valid=None, progress_callback=None,
+                        normalize_movie=True, chunk_size=CHUNK_SIZE, client=None):
+    """
+    Stream a file to a preview file record while it is still being written.
+
+    Args:
+        preview_file (dict): The preview file created with gazu.task.create_preview.
+        file_path (str): The file being written.
+        is_complete (threading.Event): Set by the writer once the file is complete.
+        is_valid (callable, optional): Returns False if the writer failed, which aborts the upload.
+        progress_callback (callable, optional): Called with (bytes_sent, 0) as the total is unknown.
+
+    Returns:
+        dict: The uploaded preview file.
+    """
+    client = client or gazu.client.default_client
+    path = 'pictures/preview-files/%s' % preview_file['id']
+    if not normalize_movie:
+        path += '?normalize=false'
+    url = gazu.client.get_full_url(path, client=client)
+
+    encoder = GrowingFileEncoder(
+        file_path, is_complete, is_valid=is_valid, chunk_size=chunk_size, progress_callback=progress_callback
+    )
+    headers = gazu.client.make_auth_header(client=client)
+    headers['Content-Type'] = encoder.content_type
+    response = client.session.post(url, data=iter(encoder), headers=headers)
+    return read_upload_response(response, path)
+
+
+def read_upload_response(response, path):
+    if response.status_code == 401:
+        raise NotAuthenticatedException(path)
+    if response.status_code >= 400:
+        raise UploadFailedException(f'{response.status_code}: {response.text}')
+
+    result = response.json()
+    if 'message' in result:
+        raise UploadFailedException(result['message'])
+    return result
+
+
+def add_preview(task, comment, file_path, progress_callback=None, normalize_movie=True, is_cancelled=None,
+                client=None):
+    """ Same as gazu.task.add_preview, but streamed with progress, retries and cancellation """
+    kwargs = {'client': client} if client else {}
+    preview_file = gazu.task.create_preview(task, comment, **kwargs)
+    return upload_preview_file(
+        preview_file,
+        file_path,
+        progress_callback=progress_callback,
+        normalize_movie=normalize_movie,
+        is_cancelled=is_cancelled,
+        client=client
+    )
@@ -0,0 +1,182 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Video codec options for each speed/quality preset
+PRESETS = {
+    'Review (ultrafast)': ['-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '28'],
+    'Balanced': ['-c:v', 'libx264', '-preset', 'medium', '-crf', '23'],
+    'Archival': ['-c:v', 'libx264', '-preset', 'slow', '-crf', '16'],
+}
+DEFAULT_PRESET = 'Balanced'
+
+MIN_SEGMENT_FRAMES = 100  # Shorter segments spend more time starting ffmpeg than encoding
+
+
+def default_segment_count():
+    # EXR decoding is mostly single threaded, two cores per segment keeps x264 busy too
+    return max(2, min(8, (os.cpu_count() or 2) // 2))
+
+
+def split_ranges(count, segments):
+    """ Split count frames into at most segments contiguous (start, end) ranges """
+    segments = max(1, min(segments, count // MIN_SEGMENT_FRAMES))
+    size, extra = divmod(count, segments)
+    ranges = []
+    start = 0
+    for index in range(segments):
+        end = start + size + (1 if index < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def write_concat_list(list_path, files):
+    with open(list_path, 'w') as f:
+        for file in files:
+            f.write(f"file '{file}'\n")
+    return list_path
+
+
+def sequence_cmd(ffmpeg, list_file, fps, output, preset=DEFAULT_PRESET, threads=None, extra_output_args=()):
+    cmd = [
+        ffmpeg,
+        "-progress", "pipe:1", "-nostats",
+        "-apply_trc", "bt709",
+        "-y", "-f", "concat", "-safe", "0", "-r", str(fps),
+        "-i", list_file,
+        *PRESETS[preset],
+        "-pix_fmt", "yuv420p",
+        "-r", str(fps),
+    ]
+    if threads:
+        cmd += ["-threads", str(threads)]
+    return cmd + list(extra_output_args) + [output]
+
+
+def read_progress(stream):
+    """ Yield each key=value block written by ffmpeg -progress """
+    stats = {}
+    for line in stream:
+        key, _, value = line.strip().partition('=')
+        stats[key] = value
+        if key == 'progress':
+            yield stats
+            stats = {}
+
+
+def encode_part(ffmpeg, files, fps, output, preset=DEFAULT_PRESET, threads=None, extra_output_args=(),
+                progress_callback=None, log_path=None, is_cancelled=None):
+    """
+    Encode an image sequence with one ffmpeg process.
+
+    Args:
+        progress_callback (callable, optional): Called with each ffmpeg -progress block.
+        log_path (str, optional): File receiving ffmpeg's error messages, next to output by default.
+        is_cancelled (callable, optional): Returns True to kill ffmpeg.
+
+    Returns:
+        int: The ffmpeg return code.
+    """
+    creationflags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+    list_file = write_concat_list(output + '.txt', files)
+    log_path = log_path or output + '.log'
+    cmd = sequence_cmd(ffmpeg, list_file, fps, output, preset, threads, extra_output_args)
+    cmd[1:1] = ["-loglevel", "error"]
+    try:
+        with open(log_path, 'w') as log:
+            process = subprocess.Popen(
+                cmd, stdout=subprocess.PIPE, stderr=log, universal_newlines=True, creationflags=creationflags
+            )
+            for stats in read_progress(process.stdout):
+                if is_cancelled is not None and is_cancelled():
+                    process.kill()
+                    break
+                if progress_callback:
+                    progress_callback(stats)
+            return process.wait()
+    finally:
+        os.remove(list_file)
+
+
+def encode_segmented(ffmpeg, files, fps, output, preset=DEFAULT_PRESET, segments=None, extra_output_args=(),
+                     progress_callback=None, is_cancelled=None):
+    """
+    Encode an image sequence as contiguous segments in parallel ffmpeg processes, then join
+    the parts without re-encoding with the concat demuxer.
+
+    Args:
+        extra_output_args (list): Options for the joined file only, like movflags.
+        progress_callback (callable, optional): Called with (frames_done, summed_fps, summed_speed).
+
+    Returns:
+        tuple: The ffmpeg return code and the error messages of the step that failed.
+    """
+    ranges = split_ranges(len(files), segments or default_segment_count())
+    threads = max(1, (os.cpu_count() or 1) // len(ranges))
+    temp_dir = tempfile.mkdtemp(prefix='kitsu_segments_')
+    parts = [os.path.join(temp_dir, f'part_{index:03d}.mp4') for index in range(len(ranges))]
+
+    lock = threading.Lock()
+    frames = [0] * len(ranges)
+    fps_values = [0.0] * len(ranges)
+    speeds = [0.0] * len(ranges)
+
+    def on_part_progress(index, stats):
+        with lock:
+            frames[index] = to_number(stats.get('frame'), int)
+            fps_values[index] = to_number(stats.get('fps'), float)
+            speeds[index] = to_number(stats.get('speed', '').rstrip('x'), float)
+            totals = (sum(frames), sum(fps_values), sum(speeds))
+        if progress_callback:
+            progress_callback(*totals)
+
+    def encode(index):
+        start, end = ranges[index]
+        return encode_part(
+            ffmpeg, files[start:end], fps, parts[index], preset, threads,
+            progress_callback=lambda stats: on_part_progress(index, stats),
+            is_cancelled=is_cancelled
+        )
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            codes = list(executor.map(encode, range(len(ranges))))
+        for index, code in enumerate(codes):
+            if code != 0:
+                return code, _read_log(parts[index] + '.log')
+
+        # Every part starts on a keyframe with the same settings, so they can be joined as is
+        join_list = write_concat_list(os.path.join(temp_dir, 'parts.txt'), parts)
+        join_log = os.path.join(temp_dir, 'join.log')
+        with open(join_log, 'w') as log:
+            code = subprocess.call(
+                [ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", join_list,
+                 "-c", "copy", *extra_output_args, output],
+                stdout=subprocess.DEVNULL, stderr=log,
+                creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+            )
+        return code, _read_log(join_log) if code != 0 else ''
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _read_log(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return ''
+
+
+def to_number(value, cast):
+    """ Parse an ffmpeg progress value, which can be N/A """
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return 0
@@ -0,0 +1,119 @@
+import threading
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+import gazu
+
+from tree_snapshot import full_task_to_row
+
+
+TASK_EVENTS = ('task:new', 'task:update', 'task:assign', 'task:unassign', 'task:delete')
+PREVIEW_EVENT_PREFIX = 'preview-file:'
+MAX_POLL_DELAY = 600  # Seconds between attempts while the event log can't be read
+
+
+class TaskEventListener(QThread):
+    """
+    Listens to Kitsu task and preview events and emits the refreshed tree rows.
+
+    It subscribes through gazu.events (socket.io) and falls back to polling
+    gazu.sync.get_last_events when the event socket cannot be reached.
+    """
+    task_row_changed = pyqtSignal(dict)  # Fresh tree row for a new or updated task
+    task_removed = pyqtSignal(str)  # Task id to remove from the tree
+    log_update = pyqtSignal(str)
+
+    def __init__(self, only_my_tasks=False, poll_interval=30):
+        super().__init__()
+        self.only_my_tasks = only_my_tasks
+        self.poll_interval = poll_interval
+        self.stop_event = threading.Event()
+        self.event_client = None
+        self.user_id = None
+
+    def run(self):
+        self.stop_event.clear()
+        try:
+            self.user_id = gazu.client.get_current_user()['id']
+        except Exception as eee:
+            self.log_update.emit(f'Live updates disabled: {eee}')
+            return
+
+        try:
+            self.event_client = gazu.events.init()
+            gazu.events.add_listener(self.event_client, '*', self.on_socket_event)
+            self.log_update.emit('Live updates: listening to Kitsu events')
+            while not self.stop_event.wait(1):
+                if not self.event_client.connected:
+                    raise ConnectionError('event socket disconnected')
+        except Exception as eee:
+            if self.stop_event.is_set():
+                return
+            self.log_update.emit(f'Live updates: event socket unavailable ({eee}), polling instead')
+            self.poll()
+        finally:
+            if self.event_client is not None:
+                try:
+                    self.event_client.disconnect()
+                except Exception:
+                    pass
+                self.event_client = None
+
+    def poll(self):
+        """ Poll the event log until stopped, a failing request is reported and retried later """
+        after = None
+        started = False
+        delay = self.poll_interval
+        while not self.stop_event.is_set():
+            try:
+                if not started:
+                    # Start from the last event known by the server so local clock drift does not matter
+                    last_events = gazu.sync.get_last_events(page_size=1)
+                    after = last_events[0]['created_at'][:19] if last_events else None
+                    started = True
+                else:
+                    events = gazu.sync.get_last_events(after=after)
+                    # Events come newest first
+                    for event in reversed(events):
+                        self.handle_event(event['name'], event.get('data') or {})
+                    if events:
+                        after = events[0]['created_at'][:19]
+                delay = self.poll_interval
+            except Exception as eee:
+                # Network down or no access to the event log, back off instead of hammering the server
+                delay = min(delay * 2, MAX_POLL_DELAY)
+                self.log_update.emit(f'Live updates: polling failed ({eee}), retrying in {delay}s')
+            self.stop_event.wait(delay)
+
+    def stop(self):
+        self.stop_event.set()
+        self.wait()
+
+    def on_socket_event(self, event_name, data):
+        if self.stop_event.is_set():
+            return
+        self.handle_event(event_name, data or {})
+
+    def handle_event(self, event_name, data):
+        if event_name not in TASK_EVENTS and not event_name.startswith(PREVIEW_EVENT_PREFIX):
+            return
+
+        try:
+            task_id = data.get('task_id')
+            if task_id is None and data.get('preview_file_id'):
+                task_id = gazu.files.get_preview_file(data['preview_file_id'])['task_id']
+            if task_id is None:
+                return
+
+            if event_name == 'task:delete':
+                self.task_removed.emit(task_id)
+                return
+
+            task = gazu.task.get_task(task_id)
+            if self.only_my_tasks and self.user_id not in task.get('assignees', []):
+                self.task_removed.emit(task_id)
+                return
+
+            self.task_row_changed.emit(full_task_to_row(task))
+        except Exception as eee:
+            self.log_update.emit(f'Live updates: cannot apply {event_name} ({eee})')
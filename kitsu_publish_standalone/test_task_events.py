@@ -0,0 +1,108 @@
+"""
+TaskEventListener against a socket.io stand-in, no Kitsu server needed.
+
+    python -m unittest test_task_events
+"""
+import unittest
+from unittest import mock
+
+try:
+    import gazu
+    import task_events
+    from task_events import TaskEventListener
+    missing = None
+except ImportError as eee:  # PyQt5 or gazu missing
+    missing = str(eee)
+
+
+TASK = {
+    'id': 'task-1',
+    'assignees': ['user-1'],
+    'project': {'name': 'Project'},
+    'task_type': {'name': 'Compositing', 'for_entity': 'Shot'},
+    'sequence': {'name': 'SQ010'},
+    'entity_type': {'name': 'Shot'},
+    'entity': {'name': 'SH0010', 'preview_file_id': None},
+}
+LAST_EVENT = {'name': 'task:update', 'created_at': '2024-01-01T00:00:00.000000', 'data': {'task_id': 'task-0'}}
+NEW_EVENT = {'name': 'task:update', 'created_at': '2024-01-01T00:01:00.000000', 'data': {'task_id': 'task-1'}}
+
+
+class StandInSocket:
+    """ What gazu.events.init returns, connected until the test drops it """
+
+    def __init__(self):
+        self.connected = True
+        self.handlers = {}
+
+    def disconnect(self):
+        self.connected = False
+
+
+@unittest.skipIf(missing, f'task_events needs PyQt5 and gazu ({missing})')
+class TaskEventListenerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.listener = TaskEventListener(poll_interval=0.01)
+        self.rows = []
+        self.logs = []
+        self.listener.task_row_changed.connect(self.rows.append)
+        self.listener.log_update.connect(self.logs.append)
+        patches = [
+            mock.patch.object(gazu.client, 'get_current_user', return_value={'id': 'user-1'}),
+            mock.patch.object(gazu.task, 'get_task', return_value=TASK),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def poll_responses(self, *responses):
+        """ get_last_events stand-in answering responses in turn, then stopping the listener """
+        responses = list(responses)
+
+        def get_last_events(*args, **kwargs):
+            if not responses:
+                self.listener.stop_event.set()
+                return []
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        return mock.patch.object(gazu.sync, 'get_last_events', side_effect=get_last_events)
+
+    def test_socket_down_falls_back_to_polling(self):
+        with mock.patch.object(gazu.events, 'init', side_effect=ConnectionError('refused')), \
+                self.poll_responses([LAST_EVENT], [NEW_EVENT]):
+            self.listener.run()
+
+        self.assertEqual([row['context_id'] for row in self.rows], ['task-1'])
+        self.assertTrue(any('polling instead' in log for log in self.logs))
+
+    def test_socket_dropped_falls_back_to_polling(self):
+        socket = StandInSocket()
+
+        def add_listener(client, event, handler):
+            client.handlers[event] = handler
+            handler('task:update', {'task_id': 'task-1'})  # One event through the socket
+            client.connected = False  # Then the connection drops
+
+        with mock.patch.object(gazu.events, 'init', return_value=socket), \
+                mock.patch.object(gazu.events, 'add_listener', side_effect=add_listener), \
+                self.poll_responses([LAST_EVENT], [NEW_EVENT]):
+            self.listener.run()
+
+        self.assertEqual([row['context_id'] for row in self.rows], ['task-1', 'task-1'])
+        self.assertFalse(socket.connected)
+
+    def test_polling_errors_do_not_escape(self):
+        with mock.patch.object(gazu.events, 'init', side_effect=ConnectionError('refused')), \
+                mock.patch.object(task_events, 'MAX_POLL_DELAY', 0.05), \
+                self.poll_responses(PermissionError('event log'), [LAST_EVENT], OSError('network'), [NEW_EVENT]):
+            self.listener.run()  # Would raise out of QThread.run and abort the publisher
+
+        self.assertEqual([row['context_id'] for row in self.rows], ['task-1'])
+        self.assertEqual(len([log for log in self.logs if 'polling failed' in log]), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
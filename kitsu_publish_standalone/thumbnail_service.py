@@ -0,0 +1,103 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+import gazu
+
+
+class ThumbnailCache:
+    """ On-disk thumbnail cache keyed by preview file id, evicting the least recently used files past max_bytes """
+
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.total_bytes = sum(entry.stat().st_size for entry in self._entries())
+
+    def _entries(self):
+        return [entry for entry in os.scandir(self.cache_dir) if entry.is_file() and entry.name.endswith('.png')]
+
+    def path_for(self, preview_id):
+        return os.path.join(self.cache_dir, f'{preview_id}.png')
+
+    def get(self, preview_id):
+        """ Return the cached thumbnail path or None, marking it as recently used """
+        path = self.path_for(preview_id)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def add(self, preview_id, file_path):
+        """ Move a downloaded thumbnail into the cache and return its cached path """
+        path = self.path_for(preview_id)
+        with self.lock:
+            os.replace(file_path, path)
+            self.total_bytes += os.path.getsize(path)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+        return path
+
+    def _evict(self):
+        # Previews never change once uploaded, so the oldest access time is all we need
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        self.total_bytes = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self.total_bytes -= size
+            except OSError:
+                pass
+
+
+class ThumbnailService(QObject):
+    """ Downloads preview thumbnails on a bounded thread pool, once per preview file id """
+    thumbnail_ready = pyqtSignal(str, str)  # preview_id, cached file path
+
+    def __init__(self, cache_dir, max_workers=6, max_bytes=256 * 1024 * 1024):
+        super().__init__()
+        self.cache = ThumbnailCache(cache_dir, max_bytes)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.in_flight = set()
+        self.lock = threading.Lock()
+
+    def request(self, preview_id):
+        """ Emit thumbnail_ready for this preview, from the cache or after downloading it """
+        if not preview_id:
+            return
+
+        path = self.cache.get(preview_id)
+        if path:
+            self.thumbnail_ready.emit(preview_id, path)
+            return
+
+        with self.lock:
+            if preview_id in self.in_flight:
+                return
+            self.in_flight.add(preview_id)
+        self.executor.submit(self._download, preview_id)
+
+    def _download(self, preview_id):
+        temp_path = os.path.join(self.cache.cache_dir, f'{preview_id}.{threading.get_ident()}.part')
+        try:
+            gazu.files.download_preview_file_thumbnail(preview_id, temp_path)
+            path = self.cache.add(preview_id, temp_path)
+            self.thumbnail_ready.emit(preview_id, path)
+        except Exception as eee:
+            print(f'Cannot download thumbnail {preview_id}: {eee}')
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        finally:
+            with self.lock:
+                self.in_flight.discard(preview_id)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
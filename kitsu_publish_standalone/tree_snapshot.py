@@ -0,0 +1,105 @@
+import gazu
+
+
+def task_to_row(task, task_types, entities, entity_types):
+    """ Build a tree row (Project > Type > Sequence > Element > Task) from a raw task and lookup dicts """
+    task_type = task_types.get(task['task_type_id'], {})
+    entity = entities.get(task['entity_id'], {})
+    parent = entities.get(entity.get('parent_id'), {})
+
+    # Shots live under their sequence, everything else under its entity type
+    if entity_types.get(parent.get('entity_type_id'), {}).get('name') == 'Sequence':
+        seq = parent['name']
+    else:
+        seq = entity_types.get(entity.get('entity_type_id'), {}).get('name')
+
+    return {
+        'project': task.get('project_name'),
+        'type': task_type.get('for_entity'),
+        'seq': seq,
+        'element': entity.get('name'),
+        'task': task_type.get('name'),
+        'context_id': task['id'],
+        'preview_id': entity.get('preview_file_id'),
+    }
+
+
+def todo_task_to_row(task):
+    """ Build a tree row from a task of the user to-do list, which already holds the joined names """
+    seq = task.get('sequence_name') or task.get('entity_type_name')
+    return {
+        'project': task.get('project_name'),
+        'type': task.get('task_type_for_entity'),
+        'seq': seq,
+        'element': task.get('entity_name'),
+        'task': task.get('task_type_name'),
+        'context_id': task['id'],
+        'preview_id': task.get('entity_preview_file_id'),
+    }
+
+
+def full_task_to_row(task):
+    """ Build a tree row from a task fetched with gazu.task.get_task, which embeds its relations """
+    try:
+        seq = task['sequence']['name']
+    except (KeyError, TypeError):
+        seq = task['entity_type']['name']
+    if seq is None:
+        seq = task.get('entity_type_name')
+
+    return {
+        'project': task['project']['name'],
+        'type': task['task_type']['for_entity'],
+        'seq': seq,
+        'element': task['entity']['name'],
+        'task': task['task_type']['name'],
+        'context_id': task['id'],
+        'preview_id': task['entity']['preview_file_id'],
+    }
+
+
+def load_tree_snapshot(only_my_tasks=False, projects=None, is_running=None, cache=None):
+    """
+    Load every task row needed by the task tree with a constant number of requests per project.
+
+    Task types and entity types are fetched once, then for each project the tasks and
+    entities are fetched in bulk and joined locally by id.
+
+    Args:
+        only_my_tasks (bool): Only load the tasks assigned to the current user.
+        projects (list, optional): Projects to load, defaults to all open projects.
+        is_running (callable, optional): Returns False when the loading should stop.
+        cache (KitsuCache, optional): Local cache to read the tasks, task types and projects from.
+
+    Returns:
+        list: Row dicts with project, type, seq, element, task, context_id and preview_id keys,
+        or None if the loading was interrupted.
+    """
+    if only_my_tasks:
+        tasks = cache.all_tasks_to_do() if cache else gazu.user.all_tasks_to_do()
+        return [todo_task_to_row(task) for task in tasks]
+
+    if projects is None:
+        projects = cache.all_open_projects() if cache else gazu.project.all_open_projects()
+
+    task_types = {t['id']: t for t in (cache.all_task_types() if cache else gazu.task.all_task_types())}
+    entity_types = {t['id']: t for t in gazu.entity.all_entity_types()}
+
+    rows = []
+    for project in projects:
+        if is_running is not None and not is_running():
+            return None
+
+        if cache:
+            tasks = cache.all_tasks_for_project(project)
+        else:
+            tasks = gazu.client.fetch_all('tasks', params={'project_id': project['id']})
+        entities = {
+            e['id']: e for e in gazu.client.fetch_all('entities', params={'project_id': project['id']})
+        }
+
+        for task in tasks:
+            task['project_name'] = project['name']
+            rows.append(task_to_row(task, task_types, entities, entity_types))
+
+    return rows